@@ -1,10 +1,26 @@
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Recipe, Tag
+from recipes.postings import filter_by_ingredients
+from recipes.search import search_recipes
+
+# Каждой сортировке соответствует индекс в Recipe.Meta.indexes.
+RECIPE_ORDERINGS = {
+    'pub_date': ('-pub_date', '-id'),
+    'cooking_time': ('cooking_time', 'id'),
+    'popular': ('-favorites_count', '-id'),
+    # Индекс RecipeRanking.Meta.indexes, пересчёт - refresh_rankings.
+    'trending': ('-ranking__trending_score', '-id'),
+}
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Список чисел через запятую: ?ingredients=1,2,3."""
 
 
 class RecipeFilter(filters.FilterSet):
-    """Фильтр выборки рецепта по избранному, автору, списку покупок и тегам."""
+    """Фильтр выборки рецепта по избранному, автору, списку покупок, тегам,
+       ингредиентам и поисковому запросу."""
 
     author = filters.CharFilter(
         field_name='author'
@@ -20,10 +36,26 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_shopping_cart'
     )
+    ingredients = NumberInFilter(
+        method='get_ingredients'
+    )
+    exclude_ingredients = NumberInFilter(
+        method='get_ingredients'
+    )
+    search = filters.CharFilter(
+        method='get_search'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=tuple((name, name) for name in RECIPE_ORDERINGS),
+        method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+            'ingredients', 'exclude_ingredients', 'search', 'ordering'
+        )
 
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -43,15 +75,22 @@ class RecipeFilter(filters.FilterSet):
             'recipe', flat=True)
         return queryset.filter(id__in=recipes_id) if value else queryset.all()
 
+    def get_ingredients(self, queryset, name, value):
+        """Рецепты со всеми ингредиентами ?ingredients= и без ингредиентов
+           ?exclude_ingredients=; оба условия применяются вместе."""
+        data = self.form.cleaned_data
+        if name == 'exclude_ingredients' and data.get('ingredients'):
+            return queryset
+        return filter_by_ingredients(
+            queryset,
+            [int(value) for value in data.get('ingredients') or ()],
+            [int(value) for value in data.get('exclude_ingredients') or ()]
+        )
 
-class IngredientFilter(filters.FilterSet):
-    """Фильтр выборки ингредиента."""
+    def get_search(self, queryset, name, value):
+        """Поиск по названию, описанию и ингредиентам; результаты
+           сортируются по релевантности, если не задан ?ordering=."""
+        return search_recipes(queryset, value)
 
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='icontains'
-    )
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
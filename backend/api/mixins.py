@@ -0,0 +1,144 @@
+import hashlib
+from calendar import timegm
+from datetime import datetime, timezone
+
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from api.services import delete_links, insert_links
+from recipes.counters import get_counter
+
+
+class NotModified(Exception):
+    """Прерывает обработку запроса готовым ответом 304/412."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def make_etag(*parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def version_modified(version):
+    """Время последнего изменения справочника по его версии."""
+    return datetime.fromtimestamp(version / 1000, tz=timezone.utc)
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list/retrieve.
+
+    Валидаторы вычисляются до сериализации ответа; при совпадении с
+    If-None-Match/If-Modified-Since сразу возвращается 304. Действие может
+    проверить валидаторы и само, вызвав check_not_modified.
+    """
+
+    conditional_actions = ('list', 'retrieve')
+    vary_headers = ()
+
+    def get_etag(self, request, *args, **kwargs):
+        return None
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        self.etag = self.last_modified = None
+        super().initial(request, *args, **kwargs)
+        if (request.method not in ('GET', 'HEAD')
+                or self.action not in self.conditional_actions):
+            return
+
+        self.check_not_modified(
+            request,
+            self.get_etag(request, *args, **kwargs),
+            self.get_last_modified(request, *args, **kwargs)
+        )
+
+    def check_not_modified(self, request, etag=None, last_modified=None):
+        """Запоминает валидаторы для ответа и прерывает запрос ответом
+        304/412, если они совпали с заголовками запроса."""
+        if etag is not None:
+            self.etag = quote_etag(make_etag(request.get_full_path(), etag))
+        if last_modified is not None:
+            self.last_modified = timegm(last_modified.utctimetuple())
+
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        etag = getattr(self, 'etag', None)
+        last_modified = getattr(self, 'last_modified', None)
+        if response.status_code in (200, 304):
+            if etag and not response.has_header('ETag'):
+                response['ETag'] = etag
+            if last_modified and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, self.vary_headers)
+        return response
+
+
+class RelationMixin:
+    """Добавление (POST) и удаление (DELETE) связи пользователя с одним
+    рецептом или автором.
+
+    Объект читается один раз, связь создаётся или удаляется одним
+    запросом, поэтому повторный или параллельный запрос получает 400/404,
+    а не ошибку уникальности.
+    """
+
+    model = None
+    target_url_kwarg = None
+    exists_message = None
+    deleted_message = None
+    missing_message = None
+
+    def get_target_queryset(self):
+        return get_counter(self.model)[2].objects.all()
+
+    def validate_target(self, target):
+        pass
+
+    def get_error(self, message):
+        return ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+
+    @transaction.atomic
+    def create(self, request, *args, **kwargs):
+        target = get_object_or_404(
+            self.get_target_queryset(), pk=self.kwargs[self.target_url_kwarg]
+        )
+        self.validate_target(target)
+        if not insert_links(self.model, request.user, (target.pk,)):
+            raise self.get_error(self.exists_message)
+        relation = get_counter(self.model)[1]
+        serializer = self.get_serializer(
+            self.model(user=request.user, **{relation: target})
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
+    def delete(self, request, *args, **kwargs):
+        target_id = int(self.kwargs[self.target_url_kwarg])
+        if delete_links(self.model, request.user, (target_id,)):
+            return Response({'detail': self.deleted_message},
+                            status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(self.get_target_queryset(), pk=target_id)
+        return Response({'detail': self.missing_message},
+                        status=status.HTTP_404_NOT_FOUND)
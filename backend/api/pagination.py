@@ -1,5 +1,150 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по ключу сортировки выборки.
+
+    Следующая страница выбирается условием на значения полей сортировки
+    последнего элемента, поэтому не нужны ни COUNT(*), ни OFFSET, и
+    глубина прокрутки не влияет на скорость. Сортировка дополняется
+    первичным ключом, чтобы ключ был уникальным. Курсор хранит сортировку,
+    для которой он выдан, и подходит только к ней.
+    """
+
+    page_size = 6
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_ordering(self, queryset):
+        ordering = list(
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        if not ordering or ordering[-1].lstrip('-') not in ('id', 'pk'):
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    def get_fields(self, queryset):
+        """Поля модели или аннотации, по которым идёт сортировка."""
+        query = queryset.query.clone()
+        return [
+            query.resolve_ref(field.lstrip('-')).output_field
+            for field in self.ordering
+        ]
+
+    def decode_cursor(self, request, queryset):
+        """Значения ключа из курсора, приведённые к типам полей
+        сортировки; 404 для испорченного курсора или курсора другой
+        сортировки."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(cursor, dict)
+                or cursor.get('ordering') != self.ordering
+                or not isinstance(cursor.get('values'), list)
+                or len(cursor['values']) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        values = []
+        for field, value in zip(self.get_fields(queryset), cursor['values']):
+            try:
+                value = field.to_python(value)
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, item):
+        values = [
+            encode_value(reduce(getattr, field.lstrip('-').split('__'), item))
+            for field in self.ordering
+        ]
+        return base64.urlsafe_b64encode(json.dumps({
+            'ordering': self.ordering, 'values': values
+        }).encode()).decode()
+
+    def get_keyset_filter(self, values):
+        keyset = Q()
+        for position, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{
+                f'{field.lstrip("-")}__{lookup}': values[position]
+            })
+            for previous, value in zip(self.ordering[:position], values):
+                condition &= Q(**{previous.lstrip('-'): value})
+            keyset |= condition
+        return keyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        values = self.decode_cursor(request, queryset)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data
+        })
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация; ?pagination=cursor включает курсорную."""
+
     page_size = 6
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            self.keyset = KeysetPagination()
+            self.keyset.page_size = self.page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,38 @@
+import csv
+import io
+
+from rest_framework.renderers import BaseRenderer
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Рендерер для выгрузки в формате txt."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = data.get('detail', data)
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    """Рендерер для выгрузки в формате csv."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = [data]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in data:
+            writer.writerow(row.values() if isinstance(row, dict) else row)
+        return buffer.getvalue().encode(self.charset)
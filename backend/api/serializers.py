@@ -1,21 +1,33 @@
-import base64
+import json
+from collections import Counter
 
 import webcolors
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import check_password
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
-from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
 from djoser.serializers import (
     PasswordSerializer, UserCreateSerializer, UserSerializer
 )
 from rest_framework import serializers
+from rest_framework.utils import html
 
-from foodgram.settings import RECIPES_LIMIT
+from api.uploads import check_image_pixels, decode_base64_image
+from api.utils import get_recipes_limit
+from foodgram.settings import (
+    BULK_IDS_LIMIT, INGREDIENT_AMOUNT_MAX, INGREDIENT_AMOUNT_MIN,
+    PANTRY_INGREDIENTS_LIMIT, PANTRY_LIMIT, PANTRY_MAX_LIMIT
+)
+from recipes.cache import get_catalog
 from recipes.models import (
-    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingCart,
+    ShoppingListItem, Tag, TagRecipe
 )
+from recipes.signals import ingredients_changed
 from users.models import Subscribe
 
 User = get_user_model()
@@ -55,6 +67,8 @@ class UserReadSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return user.is_authenticated and user.subscriber.filter(
             author=obj.id).exists()
@@ -83,7 +97,45 @@ class ChangePasswordSerializer(PasswordSerializer):
         return data
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(serializers.Serializer):
+    """Поля уменьшенных копий картинки рецепта. Пока копии не готовы,
+       в них отдаётся исходная картинка.
+    """
+
+    image_thumb = serializers.SerializerMethodField(
+        method_name='get_image_thumb'
+    )
+    image_srcset = serializers.SerializerMethodField(
+        method_name='get_image_srcset'
+    )
+
+    def build_url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_variants(self, obj):
+        if obj.image_variants.get('source') != obj.image.name:
+            return ()
+        variants = obj.image_variants['variants']
+        return variants.get(settings.RECIPE_IMAGE_FORMATS[0], ())
+
+    def get_image_thumb(self, obj):
+        variants = self.get_variants(obj)
+        if not variants:
+            return self.build_url(obj.image.name) if obj.image else None
+        return self.build_url(variants[0][1])
+
+    def get_image_srcset(self, obj):
+        variants = self.get_variants(obj)
+        if not variants:
+            return self.build_url(obj.image.name) if obj.image else None
+        return ', '.join(
+            f'{self.build_url(name)} {width}w' for width, name in variants
+        )
+
+
+class RecipeListSerializer(RecipeImageSerializer, serializers.ModelSerializer):
     """Сериализатор для вывода поля 'recipes' в просмотре подписок,
        вывод избранных рецептов и покупок.
     """
@@ -93,6 +145,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_thumb',
+            'image_srcset',
             'cooking_time'
         )
 
@@ -106,9 +160,6 @@ class SubscribeReadSerializer(serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField(
         method_name='get_recipes'
     )
-    recipes_count = serializers.SerializerMethodField(
-        method_name='get_recipes_count'
-    )
 
     class Meta:
         model = User
@@ -122,22 +173,26 @@ class SubscribeReadSerializer(serializers.ModelSerializer):
             'recipes',
             'recipes_count'
         )
+        read_only_fields = ('recipes_count',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return user.subscriber.filter(author=obj.id).exists()
 
     def get_recipes(self, obj):
-        recipes = obj.recipes.all()[:RECIPES_LIMIT]
+        request = self.context.get('request')
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all()[:get_recipes_limit(request)]
         return RecipeListSerializer(
             recipes,
             many=True,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class SubscribeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания подписок."""
@@ -155,17 +210,6 @@ class SubscribeCreateSerializer(serializers.ModelSerializer):
         model = Subscribe
         fields = '__all__'
 
-    def validate(self, data):
-        user = data.get('user')
-        author = self.context.get('author')
-        if user == author:
-            raise serializers.ValidationError(
-                'Пользователь не может подписаться сам на себя')
-
-        if Subscribe.objects.filter(user=user, author=author).exists():
-            raise serializers.ValidationError('Подписка уже существует')
-        return data
-
     def to_representation(self, instance):
         return SubscribeReadSerializer(
             instance.author,
@@ -186,13 +230,17 @@ class Hex2NameColor(serializers.Field):
 
 
 class Base64ImageField(serializers.ImageField):
+    """Картинка в виде base64 data URI или файла из multipart/form-data."""
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
+            format, _, imgstr = data.partition(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_base64_image(imgstr, name='temp.' + ext)
 
-        return super().to_internal_value(data)
+        image = super().to_internal_value(data)
+        check_image_pixels(image)
+        return image
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -229,6 +277,10 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         (создание/редактирование/удаление)."""
 
     id = serializers.IntegerField(write_only=True)
+    amount = serializers.IntegerField(
+        min_value=INGREDIENT_AMOUNT_MIN,
+        max_value=INGREDIENT_AMOUNT_MAX
+    )
 
     class Meta:
         model = IngredientRecipe
@@ -247,7 +299,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(RecipeImageSerializer, serializers.ModelSerializer):
     """Сериализатор для просмотра рецептов (GET- запросы)."""
 
     ingredients = IngredientRecipeReadSerializer(
@@ -270,6 +322,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'name',
             'text',
             'image',
+            'image_thumb',
+            'image_srcset',
             'ingredients',
             'tags',
             'cooking_time',
@@ -279,11 +333,15 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         return user.is_authenticated and user.favorite.filter(
             recipe=obj).exists()
 
     def get_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         return user.is_authenticated and user.shopping_cart.filter(
             recipe=obj).exists()
@@ -293,10 +351,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для создания/редактирования/удаления рецептов."""
 
     ingredients = IngredientRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField()
 
     class Meta:
@@ -313,49 +368,158 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('author',)
 
-    def validate_ingredients(self, data):
-        ingredients_list = []
-        ingredients_data = self.initial_data.get('ingredients')
-        ingredients = Ingredient.objects.all()
-        for ingredient in ingredients_data:
-            ingredient_id = ingredient.get('id')
-
-            if ingredient_id in ingredients_list:
-                ingredient_name = ingredients.filter(id=ingredient_id).first()
+    def parse_form_data(self, data):
+        """Данные multipart/form-data: ингредиенты приходят json-строкой,
+           теги — повторяющимся полем или json-строкой."""
+        parsed = {
+            key: data.get(key) for key in data
+            if key not in ('ingredients', 'tags')
+        }
+        if 'ingredients' in data:
+            try:
+                parsed['ingredients'] = json.loads(data.get('ingredients'))
+            except ValueError:
                 raise serializers.ValidationError(
-                    f'Вы уже выбрали ингредиент: {ingredient_name}')
-            ingredients_list.append(ingredient_id)
+                    {'ingredients': ['Ожидается json-список ингредиентов']}
+                )
+        if 'tags' in data:
+            tags = data.getlist('tags')
+            if len(tags) == 1 and tags[0].startswith('['):
+                try:
+                    tags = json.loads(tags[0])
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {'tags': ['Ожидается json-список тегов']}
+                    )
+            parsed['tags'] = tags
+        return parsed
 
-            if not ingredients.filter(id=ingredient_id).first():
-                raise serializers.ValidationError(
-                    'Несуществующий ингредиент, '
-                    'выбирете ингредиент из предустановленного списка')
+    def to_internal_value(self, data):
+        if html.is_html_input(data):
+            data = self.parse_form_data(data)
+        return super().to_internal_value(data)
 
-        if not ingredients_list:
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Временный файл картинки к этому моменту перенесён в хранилище.
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    def check_ids(self, ids, catalog, messages):
+        """Проверяет все id по справочнику из кэша и возвращает все
+           ошибки сразу: несуществующие и повторяющиеся значения."""
+        names = {item['id']: item['name'] for item in get_catalog(catalog)}
+        errors = []
+        missing = sorted(set(ids) - names.keys())
+        if missing:
+            errors.append(
+                f'{messages[0]}: {", ".join(map(str, missing))}'
+            )
+        duplicates = sorted(
+            names[item_id] for item_id, count in Counter(ids).items()
+            if count > 1 and item_id in names
+        )
+        if duplicates:
+            errors.append(f'{messages[1]}: {", ".join(duplicates)}')
+        if errors:
+            raise serializers.ValidationError(errors)
+
+    def validate_ingredients(self, data):
+        if not data:
             raise serializers.ValidationError('Задайте ингредиент')
+        self.check_ids(
+            [ingredient['id'] for ingredient in data], 'ingredients',
+            ('Несуществующие ингредиенты, выбирете ингредиенты из '
+             'предустановленного списка', 'Вы уже выбрали ингредиенты')
+        )
         return data
 
     def validate_tags(self, data):
-        tags_list = []
-        tags_data = self.initial_data.get('tags')
-        tags = Tag.objects.all()
-        for tag_id in tags_data:
-            if tag_id in tags_list:
-                tag_name = tags.filter(id=tag_id).first()
-                raise serializers.ValidationError(
-                    f'Вы уже выбрали тег: {tag_name}')
-            tags_list.append(tag_id)
-
-        if not tags_list:
+        if not data:
             raise serializers.ValidationError('Задайте тег')
+        self.check_ids(
+            data, 'tags', ('Несуществующие теги', 'Вы уже выбрали теги')
+        )
         return data
 
+    def update_ingredients(self, recipe, ingredients):
+        """Меняет только добавленные, удалённые и изменённые строки."""
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {}
+        before = {}
+        # Повторные строки одного ингредиента (из старых данных)
+        # удаляются, остаётся первая.
+        removed = []
+        for row in IngredientRecipe.objects.filter(recipe=recipe).only(
+                'id', 'ingredient_id', 'amount').order_by('id'):
+            before[row.ingredient_id] = (
+                before.get(row.ingredient_id, 0) + row.amount
+            )
+            if row.ingredient_id in current:
+                removed.append(row.id)
+            else:
+                current[row.ingredient_id] = row
+        removed.extend(
+            row.id for ingredient_id, row in current.items()
+            if ingredient_id not in amounts
+        )
+        if removed:
+            IngredientRecipe.objects.filter(id__in=removed).delete()
+
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+
+        added = [
+            IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        if added:
+            IngredientRecipe.objects.bulk_create(added)
+
+        if removed or changed or added:
+            ingredients_changed.send(
+                sender=Recipe, recipe_id=recipe.pk, before=before,
+                after=amounts
+            )
+
+    def update_tags(self, recipe, tags):
+        tags = set(tags)
+        current = set(TagRecipe.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        if current - tags:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=current - tags
+            ).delete()
+        if tags - current:
+            TagRecipe.objects.bulk_create(
+                TagRecipe(recipe=recipe, tag_id=tag_id)
+                for tag_id in tags - current
+            )
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         ingredient_data = validated_data.pop('ingredients')
         tag_data = validated_data.pop('tags')
         recipe = Recipe.objects.create(author=author, **validated_data)
-        recipe.tags.set(tag_data)
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag_id) for tag_id in tag_data
+        )
 
         ingredient_recipe = [
             IngredientRecipe(
@@ -366,41 +530,37 @@ class RecipeSerializer(serializers.ModelSerializer):
             for ingredient in ingredient_data
         ]
         IngredientRecipe.objects.bulk_create(ingredient_recipe)
+        ingredients_changed.send(
+            sender=Recipe, recipe_id=recipe.pk, before={}, after={
+                ingredient['id']: ingredient['amount']
+                for ingredient in ingredient_data
+            }
+        )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time
-        )
-        instance.image = validated_data.get('image', instance.image)
-
-        if 'ingredients' in validated_data:
-            ingredient_data = validated_data.pop('ingredients')
-            instance.ingredients.clear()
-
-        ingredient_recipe = [
-            IngredientRecipe(
-                recipe=instance,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount')
-            )
-            for ingredient in ingredient_data
-        ]
-        IngredientRecipe.objects.bulk_create(ingredient_recipe)
-
-        if 'tags' in validated_data:
-            tags_data = validated_data.pop('tags')
-            instance.tags.set(tags_data)
-
-        instance.save()
+        """Частичное обновление: меняются только переданные поля, а
+           ингредиенты и теги — только отличающиеся от текущих строки."""
+        ingredient_data = validated_data.pop('ingredients', None)
+        tag_data = validated_data.pop('tags', None)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        # updated_at меняется и при правке одних ингредиентов или тегов.
+        instance.save(update_fields=(*validated_data, 'updated_at'))
+
+        if ingredient_data is not None:
+            self.update_ingredients(instance, ingredient_data)
+        if tag_data is not None:
+            self.update_tags(instance, tag_data)
         return instance
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.for_read(request.user).get(pk=instance.pk)
         return RecipeReadSerializer(
             instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         ).data
 
 
@@ -420,14 +580,6 @@ class FavoriteSerializer(serializers.ModelSerializer):
         model = Favorite
         fields = '__all__'
 
-    def validate(self, data):
-        user = data.get('user')
-        recipe = self.context.get('recipe')
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в избранное')
-        return data
-
     def to_representation(self, instance):
         return RecipeListSerializer(
             instance.recipe,
@@ -451,16 +603,80 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         model = ShoppingCart
         fields = '__all__'
 
-    def validate(self, data):
-        user = data.get('user')
-        recipe = self.context.get('recipe')
-        if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в список покупок')
-        return data
-
     def to_representation(self, instance):
         return RecipeListSerializer(
             instance.recipe,
             context={'request': self.context.get('request')}
         ).data
+
+
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Сериализатор строки списка покупок."""
+
+    id = serializers.IntegerField(source='ingredient.id')
+    name = serializers.CharField(source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = (
+            'id',
+            'name',
+            'measurement_unit',
+            'amount'
+        )
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id рецептов или авторов для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_IDS_LIMIT
+    )
+
+    def validate_ids(self, data):
+        return list(dict.fromkeys(data))
+
+
+class BulkResultSerializer(serializers.Serializer):
+    """Результат пакетной операции для одного id."""
+
+    id = serializers.IntegerField()
+    status = serializers.CharField()
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов: ?ingredients=1,2,3&limit=20."""
+
+    ingredients = serializers.CharField()
+    limit = serializers.IntegerField(
+        min_value=1, max_value=PANTRY_MAX_LIMIT, default=PANTRY_LIMIT
+    )
+
+    def validate_ingredients(self, value):
+        try:
+            ids = {int(item) for item in value.split(',') if item.strip()}
+        except ValueError:
+            raise serializers.ValidationError(
+                'Укажите id ингредиентов через запятую')
+        if not ids:
+            raise serializers.ValidationError('Укажите хотя бы 1 ингредиент')
+        if len(ids) > PANTRY_INGREDIENTS_LIMIT:
+            raise serializers.ValidationError(
+                f'Не больше {PANTRY_INGREDIENTS_LIMIT} ингредиентов')
+        return sorted(ids)
+
+
+class PantryRecipeSerializer(RecipeListSerializer):
+    """Рецепт в подборе по продуктам: сколько ингредиентов есть и каких
+       не хватает."""
+
+    matched = serializers.IntegerField(read_only=True)
+    missing = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('matched', 'missing')
@@ -0,0 +1,124 @@
+from django.db import connection, transaction
+
+from recipes.counters import get_counter, update_counters
+from recipes.models import ShoppingCart
+from recipes.shopping_list import add_recipes, remove_recipes
+
+CREATED = 'created'
+EXISTS = 'exists'
+DELETED = 'deleted'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
+
+
+def get_columns(model):
+    _, relation, _, _ = get_counter(model)
+    quote = connection.ops.quote_name
+    return (
+        quote(model._meta.db_table),
+        quote(model._meta.get_field('user').column),
+        quote(model._meta.get_field(relation).column),
+    )
+
+
+def insert_links(model, user, target_ids):
+    """INSERT ... ON CONFLICT DO NOTHING RETURNING одним запросом.
+
+    Возвращает id объектов, связи с которыми действительно созданы:
+    уже существующие связи, в том числе созданные параллельным запросом,
+    пропускаются без ошибки. Сигналы post_save не отправляются,
+    счётчики и списки покупок обновляются здесь же.
+    """
+    if not target_ids:
+        return []
+    table, user_column, column = get_columns(model)
+    values = ', '.join(['(%s, %s)'] * len(target_ids))
+    params = [
+        value for target_id in target_ids for value in (user.pk, target_id)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user_column}, {column}) '
+            f'VALUES {values} ON CONFLICT DO NOTHING RETURNING {column}',
+            params
+        )
+        created = [row[0] for row in cursor.fetchall()]
+    update_counters(model, created, 1)
+    if model is ShoppingCart:
+        add_recipes(user.pk, created)
+    return created
+
+
+def delete_links(model, user, target_ids):
+    """DELETE ... RETURNING одним запросом, без загрузки объектов и
+    сигналов post_delete. Возвращает id объектов, связи с которыми
+    удалены; счётчики и списки покупок обновляются здесь же."""
+    if not target_ids:
+        return []
+    table, user_column, column = get_columns(model)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {column} IN ({placeholders}) RETURNING {column}',
+            (user.pk, *target_ids)
+        )
+        deleted = [row[0] for row in cursor.fetchall()]
+    update_counters(model, deleted, -1)
+    if model is ShoppingCart:
+        remove_recipes(user.pk, deleted)
+    return deleted
+
+
+def get_existing(model, target_ids):
+    _, _, target, _ = get_counter(model)
+    if not target_ids:
+        return set()
+    return set(target.objects.filter(
+        pk__in=target_ids).values_list('pk', flat=True))
+
+
+@transaction.atomic
+def bulk_add(model, user, target_ids):
+    """Связывает пользователя со списком объектов (рецептов или авторов).
+
+    Возвращает статус для каждого id: created, exists, not_found или
+    forbidden (подписка на самого себя).
+    """
+    _, _, target, _ = get_counter(model)
+    found = get_existing(model, target_ids)
+    forbidden = {user.pk} if target is type(user) else set()
+    created = set(insert_links(model, user, [
+        target_id for target_id in target_ids
+        if target_id in found and target_id not in forbidden
+    ]))
+    return {
+        target_id: (
+            NOT_FOUND if target_id not in found
+            else FORBIDDEN if target_id in forbidden
+            else CREATED if target_id in created
+            else EXISTS
+        )
+        for target_id in target_ids
+    }
+
+
+@transaction.atomic
+def bulk_remove(model, user, target_ids):
+    """Удаляет связи пользователя со списком объектов.
+
+    Возвращает статус для каждого id: deleted, missing (связи не было)
+    или not_found. Существование объектов проверяется только для тех id,
+    связи с которыми не нашлось.
+    """
+    deleted = set(delete_links(model, user, target_ids))
+    found = get_existing(model, set(target_ids) - deleted)
+    return {
+        target_id: (
+            DELETED if target_id in deleted
+            else MISSING if target_id in found
+            else NOT_FOUND
+        )
+        for target_id in target_ids
+    }
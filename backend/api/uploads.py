@@ -0,0 +1,105 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework.exceptions import ValidationError
+
+HEADER_SIZE = 12
+BASE64_CHUNK_SIZE = 64 * 1024
+
+IMAGE_TOO_LARGE = 'Картинка больше {} МБ'
+IMAGE_INVALID = 'Загрузите картинку в формате JPEG, PNG, GIF или WebP'
+IMAGE_TOO_MANY_PIXELS = 'Слишком большое разрешение картинки'
+
+
+def too_large_message():
+    return IMAGE_TOO_LARGE.format(
+        settings.RECIPE_IMAGE_MAX_SIZE // 1024 // 1024
+    )
+
+
+def is_image_header(header):
+    """Проверка сигнатуры файла по первым байтам."""
+    return (
+        header.startswith(b'\xff\xd8\xff')
+        or header.startswith(b'\x89PNG\r\n\x1a\n')
+        or header[:6] in (b'GIF87a', b'GIF89a')
+        or header[:4] == b'RIFF' and header[8:12] == b'WEBP'
+    )
+
+
+def check_image_pixels(file):
+    """Размер картинки в пикселях по заголовку, до декодирования."""
+    image = getattr(file, 'image', None)
+    if image is not None and (
+            image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS):
+        raise ValidationError(IMAGE_TOO_MANY_PIXELS)
+
+
+def decode_base64_image(encoded, name):
+    """Декодирует base64 частями во временный файл на диске.
+
+    Переносы строк и пробелы (base64 в стиле MIME) убираются заранее:
+    иначе границы частей не совпадут с группами по 4 символа.
+    """
+    encoded = ''.join(encoded.split())
+    if len(encoded) // 4 * 3 > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise ValidationError(too_large_message())
+    file = TemporaryUploadedFile(name, None, 0, None)
+    try:
+        for start in range(0, len(encoded), BASE64_CHUNK_SIZE):
+            chunk = base64.b64decode(
+                encoded[start:start + BASE64_CHUNK_SIZE]
+            )
+            if not start and not is_image_header(chunk[:HEADER_SIZE]):
+                raise ValidationError(IMAGE_INVALID)
+            file.write(chunk)
+    except (binascii.Error, ValueError):
+        file.close()
+        raise ValidationError(IMAGE_INVALID)
+    except ValidationError:
+        file.close()
+        raise
+    file.size = file.tell()
+    file.seek(0)
+    return file
+
+
+class RecipeImageUploadHandler(TemporaryFileUploadHandler):
+    """Загрузка картинки рецепта из multipart/form-data сразу на диск.
+
+    Слишком большой запрос отклоняется до чтения тела, файл — как только
+    превышен лимит или первые байты не похожи на картинку.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        max_length = settings.RECIPE_IMAGE_MAX_SIZE + (
+            settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0
+        )
+        if content_length > max_length:
+            raise ValidationError({'image': [too_large_message()]})
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header = b''
+
+    def check_header(self):
+        if not is_image_header(self.header):
+            raise ValidationError({self.field_name: [IMAGE_INVALID]})
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise ValidationError({self.field_name: [too_large_message()]})
+        if len(self.header) < HEADER_SIZE:
+            self.header += raw_data[:HEADER_SIZE - len(self.header)]
+            if len(self.header) == HEADER_SIZE:
+                self.check_header()
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if len(self.header) < HEADER_SIZE:
+            self.check_header()
+        return super().file_complete(file_size)
@@ -5,7 +5,7 @@ from rest_framework import routers
 
 from api.views import (
     FavoriteViewSet, IngredientViewSet, RecipeViewSet,
-    ShoppingCartViewSet, SubscribeViewSet, TagViewSet,
+    ShoppingCartViewSet, ShoppingListViewSet, SubscribeViewSet, TagViewSet,
     UserViewSet
 )
 
@@ -19,6 +19,8 @@ router.register(r'recipes/(?P<recipe_id>\d+)/favorite',
                 FavoriteViewSet, basename='favorite')
 router.register(r'recipes/(?P<recipe_id>\d+)/shopping_cart',
                 ShoppingCartViewSet, basename='shopping_cart')
+router.register(r'shopping_list', ShoppingListViewSet,
+                basename='shopping_list')
 router.register(r'users', UserViewSet)
 router.register(r'users/(?P<user_id>\d+)/subscribe',
                 SubscribeViewSet, basename='subscribe')
@@ -0,0 +1,49 @@
+import json
+from functools import partial
+
+from foodgram.settings import RECIPES_LIMIT
+from foodgram.streaming import stream_csv
+from recipes.models import ShoppingListItem
+
+
+def get_recipes_limit(request):
+    """Число рецептов автора в подписках из ?recipes_limit=."""
+    limit = request.query_params.get('recipes_limit', '')
+    if limit.isdigit() and int(limit) > 0:
+        return int(limit)
+    return RECIPES_LIMIT
+
+
+def get_shopping_list(user):
+    """Список покупок пользователя из материализованной таблицы."""
+    return (
+        {'name': name, 'measurement_unit': unit, 'amount': amount}
+        for name, unit, amount in ShoppingListItem.objects.filter(
+            user=user
+        ).order_by('ingredient__name').values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).iterator()
+    )
+
+
+def stream_txt(items):
+    yield 'Ваш список покупок:\n'
+    for number, item in enumerate(items, start=1):
+        yield (
+            f'{number}) {item["name"]} ({item["measurement_unit"]}) '
+            f'- {item["amount"]}\n'
+        )
+
+
+def stream_json(items):
+    yield '['
+    for number, item in enumerate(items):
+        yield (',' if number else '') + json.dumps(item, ensure_ascii=False)
+    yield ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': stream_txt,
+    'csv': partial(stream_csv, header=('name', 'measurement_unit', 'amount')),
+    'json': stream_json,
+}
@@ -1,35 +1,91 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.db.models import BooleanField, OuterRef, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import (
     IsAuthenticated, IsAuthenticatedOrReadOnly
 )
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.filters import RecipeFilter
+from api.mixins import (
+    ConditionalGetMixin, RelationMixin, version_modified
+)
 from api.pagination import CustomPagination
 from api.permissions import AdminOrAuthorOrReadOnly, UserOrAdminOrReadOnly
+from api.renderers import CSVRenderer, PlainTextRenderer
 from api.serializers import (
+    BulkIdsSerializer, BulkResultSerializer,
     ChangePasswordSerializer, FavoriteSerializer,
-    IngredientSerializer, RecipeReadSerializer,
-    RecipeSerializer, ShoppingCartSerializer,
+    IngredientSerializer, PantryQuerySerializer, PantryRecipeSerializer,
+    RecipeListSerializer, RecipeReadSerializer,
+    RecipeSerializer, ShoppingCartSerializer, ShoppingListItemSerializer,
     SubscribeCreateSerializer,
     SubscribeReadSerializer, TagSerializer,
     UserCreateSerializer, UserReadSerializer
 )
-from foodgram.settings import DOWNLOAD, SET_PASSWORD, SUBSCRIPTIONS, USER_ME
-from recipes.models import (
-    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag
+from api.services import bulk_add, bulk_remove
+from api.uploads import RecipeImageUploadHandler
+from api.utils import (
+    SHOPPING_LIST_FORMATS, get_recipes_limit, get_shopping_list
+)
+from foodgram.settings import (
+    DOWNLOAD, FAVORITE, PANTRY, SET_PASSWORD, SHOPPING_CART, SIMILAR,
+    SUBSCRIBE, SUBSCRIPTIONS, USER_ME
 )
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.cache import (
+    get_catalog, get_catalog_version, get_catalog_versions
+)
+from recipes.postings import find_pantry_recipes
+from recipes.search import ingredient_index
 from users.models import Subscribe
 
 User = get_user_model()
 
 
+def recipe_state(recipe):
+    """Всё, что попадает в ответ о рецепте, кроме полей самого рецепта:
+    их изменение отражает updated_at. Порядок и состав страницы,
+    например при ?ordering=popular, учитываются порядком состояний."""
+    author = recipe.author
+    return (
+        recipe.id, recipe.updated_at, recipe.is_favorited,
+        recipe.is_in_shopping_cart,
+        (author.id, author.username, author.email, author.first_name,
+         author.last_name, author.is_subscribed),
+        [(tag.id, tag.name, tag.color, tag.slug)
+         for tag in recipe.tags.all()],
+        [(row.ingredient_id, row.ingredient.name,
+          row.ingredient.measurement_unit, row.amount)
+         for row in recipe.ingredientrecipe_set.all()],
+    )
+
+
+def bulk_relation_response(request, model):
+    """Пакетное добавление (POST) или удаление (DELETE) связей
+       пользователя со списком объектов из {"ids": [...]}."""
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    operation = bulk_add if request.method == 'POST' else bulk_remove
+    results = operation(
+        model, request.user, serializer.validated_data['ids']
+    )
+    return Response({'results': BulkResultSerializer(
+        ({'id': target_id, 'status': status}
+         for target_id, status in results.items()),
+        many=True
+    ).data})
+
+
 class UserViewSet(viewsets.ModelViewSet):
     """Пользователи."""
 
@@ -39,6 +95,9 @@ class UserViewSet(viewsets.ModelViewSet):
     filter_backends = (filters.SearchFilter,)
     search_fields = ('first_name', 'last_name', 'username')
 
+    def get_queryset(self):
+        return super().get_queryset().with_is_subscribed(self.request.user)
+
     def get_serializer_class(self):
         """Определяет сериализатор в зависимости от типа запроса."""
         if self.request.method == 'GET' or self.request.method == 'PATCH':
@@ -80,6 +139,16 @@ class UserViewSet(viewsets.ModelViewSet):
             serializer.errors, status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(
+        methods=('POST', 'DELETE'),
+        permission_classes=(IsAuthenticated,),
+        url_path=SUBSCRIBE,
+        detail=False,
+    )
+    def bulk_subscribe(self, request):
+        """Подписка на нескольких авторов или отписка от них."""
+        return bulk_relation_response(request, Subscribe)
+
     @action(
         methods=('GET',),
         permission_classes=(IsAuthenticated,),
@@ -91,9 +160,16 @@ class UserViewSet(viewsets.ModelViewSet):
         user = self.request.user
         author_id = Subscribe.objects.filter(user=user).values_list(
             'author', flat=True)
-        author_obj = User.objects.filter(id__in=author_id)
+        author_obj = User.objects.filter(id__in=author_id).with_is_subscribed(
+            user)
 
         page = self.paginate_queryset(author_obj)
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.filter(author__in=page).top_per_author(
+                get_recipes_limit(request)):
+            recipes[recipe.author_id].append(recipe)
+        for author in page:
+            author.limited_recipes = recipes[author.id]
 
         serializer = SubscribeReadSerializer(
             page,
@@ -104,59 +180,76 @@ class UserViewSet(viewsets.ModelViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class SubscribeViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
-                       viewsets.GenericViewSet):
+class SubscribeViewSet(RelationMixin, mixins.CreateModelMixin,
+                       mixins.DestroyModelMixin, viewsets.GenericViewSet):
     """Вьюсет для создания/удаления подписок."""
 
     serializer_class = SubscribeCreateSerializer
     permission_classes = (IsAuthenticated, )
-
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context['author'] = get_object_or_404(
-            User, id=self.kwargs.get('user_id'))
-        return context
-
-    def perform_create(self, serializer):
-        author = get_object_or_404(User, id=self.kwargs.get('user_id'))
-        serializer.save(user=self.request.user, author=author)
-
-    def delete(self, request, user_id):
-        user = request.user
-        author = get_object_or_404(User, id=user_id)
-        subscription = Subscribe.objects.filter(
-            user=user, author=author).first()
-        if not subscription:
-            return Response(
-                {'detail': 'Вы не подписаны на данного пользователя'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        subscription.delete()
-        return Response(
-            {'detail': 'Успешная отписка'},
-            status=status.HTTP_204_NO_CONTENT
+    model = Subscribe
+    target_url_kwarg = 'user_id'
+    exists_message = 'Подписка уже существует'
+    deleted_message = 'Успешная отписка'
+    missing_message = 'Вы не подписаны на данного пользователя'
+
+    def get_target_queryset(self):
+        # Ответ на успешную подписку: автор уже в подписках.
+        return User.objects.annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
         )
 
+    def validate_target(self, target):
+        if target == self.request.user:
+            raise self.get_error(
+                'Пользователь не может подписаться сам на себя')
+
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Вьюсет для ингредиентов."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+
+    def get_etag(self, request, *args, **kwargs):
+        # Автодополнение не обращается к базе на каждый запрос.
+        if 'name' in request.query_params:
+            self.version = ingredient_index.get_version()
+        else:
+            self.version = get_catalog_version('ingredients')
+        return self.version
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return version_modified(self.version)
+
+    def list(self, request, *args, **kwargs):
+        """Список из кэша справочника, поиск по названию - индексом."""
+        name = request.query_params.get('name')
+        if name is None:
+            return Response(get_catalog('ingredients', self.version))
+        return Response(ingredient_index.search(name, self.version))
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Вьюсет для тегов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
 
+    def get_etag(self, request, *args, **kwargs):
+        self.version = get_catalog_version('tags')
+        return self.version
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def get_last_modified(self, request, *args, **kwargs):
+        return version_modified(self.version)
+
+    def list(self, request, *args, **kwargs):
+        """Список тегов из кэша справочника."""
+        return Response(get_catalog('tags', self.version))
+
+
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
 
     queryset = Recipe.objects.all()
@@ -164,6 +257,53 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    parser_classes = (JSONParser, MultiPartParser)
+    conditional_actions = ('retrieve',)
+    vary_headers = ('Authorization',)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [RecipeImageUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_etag(self, request, *args, **kwargs):
+        """Версия рецепта по его данным, автору и флагам пользователя.
+
+        Last-Modified не отдаётся: время изменения профиля автора
+        не хранится, а его поля входят в ответ.
+        """
+        self.catalogs = get_catalog_versions('tags', 'ingredients')
+        user = request.user
+        recipe = Recipe.objects.filter(
+            pk=kwargs.get('pk')
+        ).with_user_flags(user).annotate(
+            author_subscribed=User.objects.with_is_subscribed(user).filter(
+                pk=OuterRef('author')).values('is_subscribed')
+        ).values_list(
+            'updated_at', 'is_favorited', 'is_in_shopping_cart',
+            'author_subscribed', 'author__username', 'author__email',
+            'author__first_name', 'author__last_name'
+        ).first()
+        return recipe and (recipe, self.catalogs)
+
+    def list(self, request, *args, **kwargs):
+        """Страница рецептов; ETag считается по уже загруженной странице
+        до сериализации."""
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        self.check_not_modified(request, (
+            self.get_paginated_response(()).data,
+            [recipe_state(recipe) for recipe in page]
+        ))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_queryset(self):
+        """Для чтения подгружает связанные данные и флаги пользователя."""
+        queryset = super().get_queryset()
+        if self.request.method == 'GET':
+            return queryset.for_read(self.request.user)
+        return queryset
 
     def get_serializer_class(self):
         """Определяет сериализатор в зависимости от типа запроса."""
@@ -171,102 +311,117 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeReadSerializer
         return RecipeSerializer
 
+    @action(
+        methods=('POST', 'DELETE'),
+        permission_classes=(IsAuthenticated,),
+        url_path=FAVORITE,
+        detail=False,
+    )
+    def bulk_favorite(self, request):
+        """Добавление нескольких рецептов в избранное или удаление."""
+        return bulk_relation_response(request, Favorite)
+
+    @action(
+        methods=('POST', 'DELETE'),
+        permission_classes=(IsAuthenticated,),
+        url_path=SHOPPING_CART,
+        detail=False,
+    )
+    def bulk_shopping_cart(self, request):
+        """Добавление нескольких рецептов в покупки или удаление."""
+        return bulk_relation_response(request, ShoppingCart)
+
+    @action(
+        methods=('GET',),
+        url_path=PANTRY,
+        detail=False,
+    )
+    def pantry(self, request):
+        """Что приготовить из имеющихся продуктов: рецепты по убыванию
+           покрытия с недостающими ингредиентами."""
+        serializer = PantryQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        recipes = find_pantry_recipes(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data['limit']
+        )
+        return Response({'results': PantryRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        ).data})
+
+    @action(
+        methods=('GET',),
+        url_path=SIMILAR,
+        detail=True,
+    )
+    def similar(self, request, pk=None):
+        """Похожие рецепты, рассчитанные командой build_similar_recipes."""
+        recipes = list(Recipe.objects.filter(
+            similar_for__recipe_id=pk
+        ).only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time'
+        ).order_by('-similar_for__score', 'id'))
+        if not recipes:
+            get_object_or_404(Recipe, pk=pk)
+        return Response(RecipeListSerializer(
+            recipes, many=True, context={'request': request}
+        ).data)
+
     @action(
         methods=('GET',),
         permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer),
         url_path=DOWNLOAD,
         detail=False,
     )
     def get_shopping_cart(self, request):
-        """Скачивание списка покупок."""
-        user = self.request.user
-        recipes_id = ShoppingCart.objects.filter(user=user).values_list(
-            'recipe', flat=True)
-        recipes = IngredientRecipe.objects.filter(recipe_id__in=recipes_id)
-        recipes_dict = {}
-        for recipe in recipes:
-            ingredient = recipe.ingredient
-            amount = recipe.amount
-
-            if ingredient.id in recipes_dict:
-                recipes_dict[ingredient.id] += amount
-            else:
-                recipes_dict[ingredient.id] = amount
-
-        shop_list = ['Ваш список покупок:\n']
-        for number, (ingredient, amount) in enumerate(recipes_dict.items(),
-                                                      start=1):
-            ingredient = Ingredient.objects.get(id=ingredient)
-            shop_list += (
-                f'{number}) {ingredient.name} ({ingredient.measurement_unit})'
-                f'- {amount}\n'
+        """Скачивание списка покупок (?format=txt|csv|json)."""
+        file_format = request.accepted_renderer.format
+        items = get_shopping_list(request.user)
+        response = StreamingHttpResponse(
+            SHOPPING_LIST_FORMATS[file_format](items),
+            content_type=(
+                f'{request.accepted_renderer.media_type}; charset=utf-8'
             )
-
-        response = HttpResponse(shop_list, content_type="text/plain")
+        )
         response['Content-Disposition'] = (
-            'attachment; filename=shopping_cart.txt'
+            f'attachment; filename=shopping_cart.{file_format}'
         )
         return response
 
 
-class FavoriteViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
-                      viewsets.GenericViewSet):
+class FavoriteViewSet(RelationMixin, mixins.CreateModelMixin,
+                      mixins.DestroyModelMixin, viewsets.GenericViewSet):
     """Вьюсет для создания/удаления избранного."""
 
     serializer_class = FavoriteSerializer
     permission_classes = (IsAuthenticated, )
+    model = Favorite
+    target_url_kwarg = 'recipe_id'
+    exists_message = 'Рецепт уже добавлен в избранное'
+    deleted_message = 'Рецепт удален из избранного'
+    missing_message = 'Рецепт не был добавлен в избранное'
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context['recipe'] = get_object_or_404(
-            Recipe, id=self.kwargs.get('recipe_id'))
-        return context
-
-    def perform_create(self, serializer):
-        recipe = get_object_or_404(Recipe, id=self.kwargs.get('recipe_id'))
-        serializer.save(user=self.request.user, recipe=recipe)
 
-    def delete(self, request, recipe_id):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=recipe_id)
-        favorite = Favorite.objects.filter(user=user, recipe=recipe).first()
-        if not favorite:
-            return Response(
-                {'detail': 'Рецепт не был добавлен в избранное'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        favorite.delete()
-        return Response({'detail': 'Рецепт удален из избранного'},
-                        status=status.HTTP_204_NO_CONTENT)
-
-
-class ShoppingCartViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
-                          viewsets.GenericViewSet):
+class ShoppingCartViewSet(RelationMixin, mixins.CreateModelMixin,
+                          mixins.DestroyModelMixin, viewsets.GenericViewSet):
     """Вьюсет для создания/удаления покупок."""
 
     serializer_class = ShoppingCartSerializer
     permission_classes = (IsAuthenticated, )
+    model = ShoppingCart
+    target_url_kwarg = 'recipe_id'
+    exists_message = 'Рецепт уже добавлен в список покупок'
+    deleted_message = 'Рецепт удален из списка покупок'
+    missing_message = 'Рецепт не был добавлен в список покупок'
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context['recipe'] = get_object_or_404(
-            Recipe, id=self.kwargs.get('recipe_id'))
-        return context
 
-    def perform_create(self, serializer):
-        recipe = get_object_or_404(Recipe, id=self.kwargs.get('recipe_id'))
-        serializer.save(user=self.request.user, recipe=recipe)
+class ShoppingListViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Список покупок пользователя: ингредиенты с суммарным количеством."""
 
-    def delete(self, request, recipe_id):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=recipe_id)
-        shopping_cart = ShoppingCart.objects.filter(
-            user=user, recipe=recipe).first()
-        if not shopping_cart:
-            return Response(
-                {'detail': 'Рецепт не был добавлен в список покупок'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        shopping_cart.delete()
-        return Response({'detail': 'Рецепт удален из списка покупок'},
-                        status=status.HTTP_204_NO_CONTENT)
+    serializer_class = ShoppingListItemSerializer
+    permission_classes = (IsAuthenticated, )
+
+    def get_queryset(self):
+        return self.request.user.shopping_list.select_related(
+            'ingredient').order_by('ingredient__name')
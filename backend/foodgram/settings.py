@@ -90,6 +90,15 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -133,6 +142,8 @@ STATIC_ROOT = BASE_DIR / 'static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Служебные файлы команд (места остановки): вне раздаваемого MEDIA_ROOT.
+COMMAND_STATE_DIR = Path(os.getenv('COMMAND_STATE_DIR', BASE_DIR / 'state'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -158,5 +169,41 @@ DJOSER = {
 USER_ME = 'me'
 SET_PASSWORD = 'set_password'
 SUBSCRIPTIONS = 'subscriptions'
+SUBSCRIBE = 'subscribe'
+FAVORITE = 'favorite'
+SHOPPING_CART = 'shopping_cart'
 RECIPES_LIMIT = 3
+BULK_IDS_LIMIT = 100
 DOWNLOAD = 'download_shopping_cart'
+PANTRY = 'pantry'
+PANTRY_LIMIT = 20
+PANTRY_MAX_LIMIT = 100
+PANTRY_INGREDIENTS_LIMIT = 100
+SIMILAR = 'similar'
+SIMILAR_RECIPES_LIMIT = 10
+TRENDING_HALF_LIFE_HOURS = 48
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_CART_WEIGHT = 0.5
+TRENDING_RECENCY_WEIGHT = 10.0
+ADMIN_ESTIMATED_COUNT_MIN = 100000
+ADMIN_EXPORT_CHUNK_SIZE = 2000
+INGREDIENTS_FUZZY_LIMIT = 10
+INGREDIENT_AMOUNT_MIN = 1
+INGREDIENT_AMOUNT_MAX = 32767
+INGREDIENTS_SIMILARITY = 0.3
+INGREDIENTS_VERSION_CHECK_INTERVAL = 5
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_FALLBACK_LIMIT = 1000
+INGREDIENT_FILTER_MAX_IDS = 10000
+RECIPE_INGREDIENTS_LOG_LIMIT = 1000
+RECIPE_INGREDIENTS_LOG_TIMEOUT = 60 * 60
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_FORMATS = ('webp',)
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+RECIPE_IMAGE_RELEASE_GRACE = 60 * 60
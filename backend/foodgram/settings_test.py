@@ -0,0 +1,14 @@
+from foodgram.settings import *  # noqa: F401,F403
+
+SECRET_KEY = 'test-secret-key'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+RECIPE_IMAGE_WORKERS = 0
@@ -0,0 +1,18 @@
+import csv
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(items, header=None):
+    writer = csv.writer(Echo())
+    if header:
+        yield writer.writerow(header)
+    for item in items:
+        yield writer.writerow(
+            item.values() if isinstance(item, dict) else item
+        )
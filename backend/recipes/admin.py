@@ -1,9 +1,11 @@
 from django.contrib import admin
 
+from foodgram.admin_tools import LargeTableAdmin
 from recipes.models import (
     Favorite, Ingredient, IngredientRecipe, Recipe,
     ShoppingCart, Tag, TagRecipe
 )
+from recipes.signals import touch_recipes, track_ingredients
 
 
 class IngredientRecipeInline(admin.StackedInline):
@@ -18,7 +20,7 @@ class TagRecipeInline(admin.StackedInline):
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     """Настройки админ-панели ингредиентов."""
 
     empty_value_display = '-отсутствует-'
@@ -27,8 +29,9 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
         'measurement_unit'
     )
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
     search_fields = ('name',)
+    export_fields = ('pk', 'name', 'measurement_unit')
 
 
 @admin.register(Tag)
@@ -47,7 +50,7 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     """Настройки админ-панели рецептов."""
 
     empty_value_display = '-отсутствует-'
@@ -60,20 +63,29 @@ class RecipeAdmin(admin.ModelAdmin):
         'is_favorited',
         'pub_date'
     )
-    list_filter = ('name', 'tags__name', 'author__username')
-    search_fields = ('name', 'tags__name', 'author__username')
+    list_select_related = ('author',)
+    list_filter = ('tags',)
+    search_fields = ('^name', '=author__username')
+    autocomplete_fields = ('author',)
+    export_fields = (
+        'pk', 'name', 'cooking_time', 'author__username', 'favorites_count',
+        'in_carts_count', 'pub_date'
+    )
 
     def is_favorited(self, obj):
-        favorite_count = obj.favorite.count()
-        return favorite_count
+        return obj.favorites_count
 
     is_favorited.short_description = 'Добавлен в избранное (кол.раз)'
 
     inlines = (IngredientRecipeInline, TagRecipeInline)
 
+    def save_related(self, request, form, formsets, change):
+        with track_ingredients((form.instance.pk,)):
+            super().save_related(request, form, formsets, change)
+
 
 @admin.register(IngredientRecipe)
-class IngredientRecipeAdmin(admin.ModelAdmin):
+class IngredientRecipeAdmin(LargeTableAdmin):
     """Настройки соответствия рецептов и ингредиентов."""
 
     empty_value_display = '-отсутствует-'
@@ -83,12 +95,31 @@ class IngredientRecipeAdmin(admin.ModelAdmin):
         'recipe',
         'amount'
     )
-    list_filter = ('ingredient', 'recipe')
-    search_fields = ('ingredient', 'recipe')
+    list_select_related = ('ingredient', 'recipe')
+    search_fields = ('^ingredient__name', '^recipe__name')
+    autocomplete_fields = ('ingredient', 'recipe')
+    export_fields = ('pk', 'recipe_id', 'ingredient_id', 'amount')
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.update(IngredientRecipe.objects.filter(
+                pk=obj.pk).values_list('recipe_id', flat=True))
+        with track_ingredients(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with track_ingredients((obj.recipe_id,)):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        with track_ingredients(recipe_ids):
+            super().delete_queryset(request, queryset)
 
 
 @admin.register(TagRecipe)
-class TagRecipeAdmin(admin.ModelAdmin):
+class TagRecipeAdmin(LargeTableAdmin):
     """Настройки соответствия рецептов и тегов."""
 
     empty_value_display = '-отсутствует-'
@@ -97,27 +128,53 @@ class TagRecipeAdmin(admin.ModelAdmin):
         'tag',
         'recipe'
     )
-    list_filter = ('tag', 'recipe')
-    search_fields = ('tag', 'recipe')
+    list_select_related = ('tag', 'recipe')
+    list_filter = ('tag',)
+    search_fields = ('^recipe__name',)
+    autocomplete_fields = ('recipe',)
+    export_fields = ('pk', 'recipe_id', 'tag_id')
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.update(TagRecipe.objects.filter(
+                pk=obj.pk).values_list('recipe_id', flat=True))
+        super().save_model(request, obj, form, change)
+        touch_recipes(recipe_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        touch_recipes((obj.recipe_id,))
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        touch_recipes(recipe_ids)
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'user',
         'recipe'
     )
-    search_fields = ('pk', 'user')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('=user__username', '^recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    export_fields = ('pk', 'user_id', 'recipe_id')
     empty_value_display = '-пусто-'
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'user',
         'recipe'
     )
-    search_fields = ('pk', 'user')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('=user__username', '^recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    export_fields = ('pk', 'user_id', 'recipe_id')
     empty_value_display = '-пусто-'
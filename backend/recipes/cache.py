@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from recipes.models import CatalogVersion, Ingredient, Tag
+
+
+def load_tags():
+    return list(Tag.objects.order_by('id').values(
+        'id', 'name', 'color', 'slug'))
+
+
+def load_ingredients():
+    return list(Ingredient.objects.order_by('id').values(
+        'id', 'name', 'measurement_unit'))
+
+
+CATALOGS = {
+    'tags': load_tags,
+    'ingredients': load_ingredients,
+}
+
+
+def now_version():
+    return int(time.time() * 1000)
+
+
+def get_catalog_versions(*names):
+    """Версии справочников одним запросом: метки времени их последнего
+    изменения в мс.
+
+    Версии хранятся в базе (CatalogVersion), а не в кэше: кэш в памяти
+    процесса не узнал бы об изменениях из других процессов и команд.
+    """
+    versions = dict(CatalogVersion.objects.filter(
+        name__in=names).values_list('name', 'version'))
+    for name in names:
+        if name not in versions:
+            versions[name] = CatalogVersion.objects.get_or_create(
+                name=name, defaults={'version': now_version()}
+            )[0].version
+    return tuple(versions[name] for name in names)
+
+
+def get_catalog_version(name):
+    return get_catalog_versions(name)[0]
+
+
+def bump_catalog_version(name):
+    """Новая версия справочника; старые данные в кэше больше не читаются."""
+    version = now_version()
+    if not CatalogVersion.objects.filter(name=name).update(
+            version=Greatest(F('version') + 1, Value(version))):
+        CatalogVersion.objects.get_or_create(
+            name=name, defaults={'version': version})
+
+
+def increment_catalog_version(name):
+    """Следующий по порядку номер версии (для журналов изменений).
+
+    Строка версии заблокирована до конца транзакции, поэтому номера
+    из разных процессов не повторяются и идут без пропусков.
+    """
+    get_catalog_version(name)
+    with transaction.atomic():
+        CatalogVersion.objects.filter(name=name).update(
+            version=F('version') + 1)
+        return CatalogVersion.objects.get(name=name).version
+
+
+def get_catalog(name, version=None):
+    """Справочник (теги или ингредиенты) из кэша или из базы; version -
+    уже прочитанная в этом запросе версия."""
+    if version is None:
+        version = get_catalog_version(name)
+    key = f'catalog:{name}:{version}'
+    data = cache.get(key)
+    if data is None:
+        data = CATALOGS[name]()
+        cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,58 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe
+
+User = get_user_model()
+
+# Модель связи, поле связи, модель со счётчиком, поле счётчика.
+COUNTERS = (
+    (Recipe, 'author', User, 'recipes_count'),
+    (Favorite, 'recipe', Recipe, 'favorites_count'),
+    (ShoppingCart, 'recipe', Recipe, 'in_carts_count'),
+    (Subscribe, 'author', User, 'subscribers_count'),
+)
+
+
+def get_counter(model):
+    for counter in COUNTERS:
+        if counter[0] is model:
+            return counter
+    raise LookupError(f'Для модели {model.__name__} нет счётчика')
+
+
+def update_counters(model, target_ids, delta):
+    """Изменяет счётчики объектов, на которые ссылаются строки model.
+
+    target_ids может содержать повторы: каждый повтор - ещё одна строка.
+    """
+    _, _, target, field = get_counter(model)
+    by_count = {}
+    for target_id, count in Counter(target_ids).items():
+        by_count.setdefault(count, []).append(target_id)
+    for count, ids in by_count.items():
+        target.objects.filter(pk__in=ids).update(**{
+            field: Greatest(F(field) + delta * count, Value(0))
+        })
+
+
+def recount_counters(batch_size=1000):
+    """Пересчитывает все счётчики по данным таблиц связей."""
+    for model, relation, target, field in COUNTERS:
+        total = model.objects.filter(**{relation: OuterRef('pk')}).order_by(
+        ).values(relation).annotate(total=Count('pk')).values('total')
+        ids = target.objects.order_by('pk').values_list('pk', flat=True)
+        last_id = None
+        while True:
+            batch = ids if last_id is None else ids.filter(pk__gt=last_id)
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            target.objects.filter(pk__in=batch).update(**{
+                field: Coalesce(Subquery(total), Value(0))
+            })
+            last_id = batch[-1]
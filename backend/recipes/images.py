@@ -0,0 +1,159 @@
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def derivative_name(name, width, image_format):
+    """recipes/images/a.png -> derivatives/recipes/images/a.png.320.webp"""
+    return posixpath.join(DERIVATIVES_DIR, f'{name}.{width}.{image_format}')
+
+
+def source_name(name):
+    """Обратное к derivative_name: имя исходной картинки."""
+    prefix = DERIVATIVES_DIR + '/'
+    if not name.startswith(prefix):
+        return None
+    return name[len(prefix):].rsplit('.', 2)[0]
+
+
+def render(image, width, image_format):
+    image = image.copy()
+    image.thumbnail((width, width * 4))
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    image.save(
+        buffer, format=image_format.upper(),
+        quality=settings.RECIPE_IMAGE_QUALITY
+    )
+    return image.width, buffer.getvalue()
+
+
+def generate_derivatives(recipe_id):
+    """Создаёт уменьшенные копии картинки рецепта и сохраняет их список
+    в Recipe.image_variants. updated_at меняется вместе со списком: копии
+    попадают в ответ, и валидаторы кэша должны смениться."""
+    from recipes.models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    name = recipe.image.name
+    if recipe.image_variants.get('source') == name:
+        return
+
+    with recipe.image.storage.open(name) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    variants = {}
+    for image_format in settings.RECIPE_IMAGE_FORMATS:
+        widths = {}
+        for width in settings.RECIPE_IMAGE_WIDTHS:
+            target = derivative_name(name, width, image_format)
+            real_width, content = render(image, width, image_format)
+            if real_width in widths:
+                continue
+            if not default_storage.exists(target):
+                default_storage.save(target, ContentFile(content))
+            widths[real_width] = target
+        variants[image_format] = sorted(widths.items())
+
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants={'source': name, 'variants': variants},
+        updated_at=timezone.now()
+    )
+
+
+def release_image(name):
+    """Удаляет картинку и её копии, если на неё больше нет ссылок.
+
+    Файл, записанный или загруженный повторно за последние
+    RECIPE_IMAGE_RELEASE_GRACE секунд, не удаляется: на него может
+    сослаться ещё не закоммиченный рецепт с той же картинкой. Такие файлы
+    позже удалит cleanup_media.
+    """
+    from recipes.models import Recipe
+
+    if not name or Recipe.objects.filter(image=name).exists():
+        return
+    storage = Recipe._meta.get_field('image').storage
+    try:
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        return
+    if modified > timezone.now() - timedelta(
+            seconds=settings.RECIPE_IMAGE_RELEASE_GRACE):
+        return
+    storage.delete(name)
+    for image_format in settings.RECIPE_IMAGE_FORMATS:
+        for width in settings.RECIPE_IMAGE_WIDTHS:
+            default_storage.delete(
+                derivative_name(name, width, image_format)
+            )
+
+
+def schedule_release(name):
+    transaction.on_commit(lambda: release_image(name))
+
+
+def _generate(recipe_id):
+    """Ошибка обработки не мешает сохранению рецепта: отдаётся
+    исходная картинка."""
+    try:
+        generate_derivatives(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось создать копии картинки рецепта %s', recipe_id)
+
+
+def _run(recipe_id):
+    try:
+        _generate(recipe_id)
+    finally:
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.RECIPE_IMAGE_WORKERS,
+                    thread_name_prefix='recipe-images'
+                )
+    return _executor
+
+
+def schedule_derivatives(recipe_id):
+    """После коммита передаёт обработку картинки в пул потоков.
+
+    При RECIPE_IMAGE_WORKERS = 0 картинка обрабатывается сразу.
+    """
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(_run, recipe_id)
+        )
+    else:
+        transaction.on_commit(lambda: _generate(recipe_id))
@@ -0,0 +1,83 @@
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes.similarity import build_similar_recipes
+
+
+class Command(BaseCommand):
+    """Команда для расчёта похожих рецептов по общим ингредиентам и тегам.
+    Вызов python manage.py build_similar_recipes. С --incremental
+    пересчитываются только рецепты, изменённые с прошлого запуска, и
+    рецепты, на которые они влияют; время запуска хранится в файле.
+    """
+
+    help = 'Расчёт похожих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Пересчитать только изменённые с прошлого запуска рецепты.'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=settings.SIMILAR_RECIPES_LIMIT,
+            help='Сколько похожих рецептов хранить для каждого рецепта.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Количество рецептов, обрабатываемых за один проход.'
+        )
+        parser.add_argument(
+            '--max-df',
+            type=int,
+            default=5000,
+            help='Не учитывать ингредиенты и теги, которые есть в большем '
+                 'числе рецептов.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(
+                settings.COMMAND_STATE_DIR, 'similar_recipes_checkpoint'
+            ),
+            help='Файл, в котором хранится время прошлого запуска.'
+        )
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return datetime.fromisoformat(file.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def handle(self, *args, **options):
+        for option in ('top_k', 'batch_size', 'max_df'):
+            if options[option] < 1:
+                raise CommandError(
+                    f'--{option.replace("_", "-")} должен быть больше 0')
+        checkpoint = options['checkpoint']
+        changed_since = (
+            self.read_checkpoint(checkpoint) if options['incremental']
+            else None
+        )
+        if options['incremental'] and changed_since is None:
+            self.stdout.write(
+                'Нет времени прошлого запуска, пересчёт всех рецептов.')
+        started = timezone.now()
+        processed = build_similar_recipes(
+            options['top_k'], options['batch_size'], options['max_df'],
+            changed_since
+        )
+        os.makedirs(os.path.dirname(checkpoint) or '.', exist_ok=True)
+        with open(checkpoint, 'w', encoding='utf-8') as file:
+            file.write(started.isoformat())
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны для {processed} рецептов.'
+        ))
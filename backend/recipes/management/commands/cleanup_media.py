@@ -0,0 +1,208 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.images import DERIVATIVES_DIR, source_name
+from recipes.models import Recipe
+
+IMAGES_DIR = Recipe._meta.get_field('image').upload_to.rstrip('/')
+SCAN_ROOTS = sorted((IMAGES_DIR, f'{DERIVATIVES_DIR}/{IMAGES_DIR}'))
+
+
+def path_key(name):
+    return tuple(name.split('/'))
+
+
+def scan_files(root, directory, marker=None):
+    """Файлы каталога в порядке os.scandir, без чтения всего каталога в
+    память: (путь от MEDIA_ROOT, размер, время изменения).
+
+    С marker файлы до него включительно пропускаются; если такого файла
+    уже нет, каталог просматривается с начала. Скрытые файлы и каталоги
+    (имя начинается с точки) не просматриваются.
+    """
+    skipping = marker is not None
+    with os.scandir(os.path.join(root, directory)) as entries:
+        for entry in entries:
+            if (entry.name.startswith('.')
+                    or not entry.is_file(follow_symlinks=False)):
+                continue
+            if skipping:
+                skipping = entry.name != marker
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            yield f'{directory}/{entry.name}', stat.st_size, stat.st_mtime
+    if skipping:
+        yield from scan_files(root, directory)
+
+
+def scan(root, directory, after=()):
+    """Рекурсивно обходит каталог: сначала его файлы (scan_files), затем
+    подкаталоги в порядке имён. В памяти держатся только имена
+    подкаталогов, а не список файлов.
+
+    after - место остановки прошлого запуска: компоненты пути после
+    directory. Всё, что обработано до него, пропускается.
+    """
+    subdirectories = []
+    try:
+        with os.scandir(os.path.join(root, directory)) as entries:
+            for entry in entries:
+                if (not entry.name.startswith('.')
+                        and entry.is_dir(follow_symlinks=False)):
+                    subdirectories.append(entry.name)
+    except FileNotFoundError:
+        return
+    if len(after) < 2:
+        yield from scan_files(root, directory, after[0] if after else None)
+    for name in sorted(subdirectories):
+        if len(after) > 1 and name < after[0]:
+            continue
+        yield from scan(
+            root, f'{directory}/{name}',
+            after[1:] if len(after) > 1 and name == after[0] else ()
+        )
+
+
+def scan_roots(root, after=None):
+    """Файлы всех каталогов картинок, начиная с места остановки after."""
+    for directory in SCAN_ROOTS:
+        key = path_key(directory)
+        if after is None or after[:len(key)] < key:
+            yield from scan(root, directory)
+        elif after[:len(key)] == key:
+            yield from scan(root, directory, after[len(key):])
+
+
+class Command(BaseCommand):
+    """Команда для поиска и удаления картинок рецептов, на которые не
+    ссылается ни один рецепт, и их уменьшенных копий.
+    Вызов python manage.py cleanup_media. Каталоги обходятся потоково,
+    ссылки проверяются пачками, место остановки сохраняется после каждой
+    пачки: следующий запуск, в том числе после прерванного, продолжит с
+    него.
+    """
+
+    help = 'Поиск и удаление неиспользуемых картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Удалять найденные файлы (по умолчанию только отчёт).'
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Не трогать файлы, изменённые позже, чем столько часов назад.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество файлов, проверяемых одним запросом.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=0,
+            help='Сколько файлов просмотреть за запуск (0 — все).'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(
+                settings.COMMAND_STATE_DIR, 'cleanup_media_checkpoint'
+            ),
+            help='Файл, в котором хранится место остановки.'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Начать обход сначала, не учитывая сохранённое место.'
+        )
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return path_key(file.read().strip()) or None
+        except FileNotFoundError:
+            return None
+
+    def write_checkpoint(self, path, name):
+        if name is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(name)
+
+    def find_orphans(self, batch):
+        sources = {name: source_name(name) or name for name, *_ in batch}
+        referenced = set(Recipe.objects.filter(
+            image__in=set(sources.values())
+        ).values_list('image', flat=True))
+        return [
+            item for item in batch if sources[item[0]] not in referenced
+        ]
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        limit = options['limit']
+        if limit < 0:
+            raise CommandError('--limit не может быть отрицательным')
+        checkpoint = options['checkpoint']
+        after = None if options['reset'] else self.read_checkpoint(checkpoint)
+        deadline = time.time() - options['grace_hours'] * 60 * 60
+
+        root = str(settings.MEDIA_ROOT)
+        files = scan_roots(root, after)
+        if limit:
+            files = islice(files, limit)
+
+        scanned = orphans = orphan_size = 0
+        last_name = '/'.join(after) if after else None
+        while True:
+            batch = list(islice(files, batch_size))
+            if not batch:
+                break
+            scanned += len(batch)
+            old = [item for item in batch if item[2] < deadline]
+            deleted = set()
+            for name, size, _ in self.find_orphans(old) if old else ():
+                orphans += 1
+                orphan_size += size
+                if options['verbosity'] > 1:
+                    self.stdout.write(name)
+                if options['delete']:
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except FileNotFoundError:
+                        pass
+                    deleted.add(name)
+            # Место остановки - последний оставшийся файл пачки: по нему
+            # следующий запуск найдёт, откуда продолжать.
+            kept = [name for name, *_ in batch if name not in deleted]
+            if kept:
+                last_name = kept[-1]
+                self.write_checkpoint(checkpoint, last_name)
+
+        finished = not limit or scanned < limit
+        if finished:
+            self.write_checkpoint(checkpoint, None)
+
+        action = 'Удалено' if options['delete'] else 'Найдено'
+        state = (
+            'Обход завершён.' if finished
+            else f'Обход продолжится после {last_name}.'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Просмотрено файлов: {scanned}. {action} неиспользуемых: '
+            f'{orphans} ({orphan_size / 1024 / 1024:.1f} МБ). {state}'
+        ))
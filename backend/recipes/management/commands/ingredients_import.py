@@ -1,34 +1,135 @@
 import csv
+import json
 import os
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from recipes.cache import bump_catalog_version
 from recipes.models import Ingredient
 
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    """Построчно читает пары (название, единица измерения) из csv."""
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """Потоково читает массив объектов {name, measurement_unit} из json."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer) or started and buffer[position] == '{':
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise CommandError('Некорректный json-файл')
+                chunk = file.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield item['name'], item['measurement_unit']
+            position = end
+        elif not started and buffer[position] == '[':
+            started = True
+            position += 1
+        elif started and buffer[position] == ']':
+            return
+        else:
+            raise CommandError('Ожидается json-массив ингредиентов')
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
-    """Команда для импорта csv в базу.
+    """Команда для импорта ингредиентов в базу.
     Вызов python manage.py ingredients_import из терминала в соответствующей
-    папке.
+    папке. Файл читается потоково и загружается пачками, уже существующие
+    ингредиенты пропускаются, поэтому команду можно запускать повторно.
     """
 
-    help = 'Импорт csv файлов в таблицы базы.'
+    help = 'Импорт ингредиентов из csv или json файла в базу.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Путь к файлу .csv или .json с ингредиентами.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество ингредиентов в одной пачке.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, что будет загружено, без записи в базу.'
+        )
 
     def handle(self, *args, **options):
-        base_dir = settings.BASE_DIR
-        file_path = os.path.join(base_dir, 'data', 'ingredients.csv')
-
-        with open(file_path, encoding='utf-8', mode='r') as csv_file:
-            csv_read = csv.reader(csv_file)
-            for row in csv_read:
-                name = row[0]
-                measurement_unit = row[1]
-
-                obj, created = Ingredient.objects.get_or_create(
-                    name=name, measurement_unit=measurement_unit)
-                if not created:
-                    self.stdout.write(
-                        self.style.WARNING(f'Ингредиент {name} существует'))
-
-        return 'Ингредиенты загружены успешно'
+        file_path = options['path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension not in READERS:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+
+        seen = set()
+        inserted = skipped = 0
+        with open(file_path, encoding='utf-8', mode='r') as file:
+            rows = READERS[extension](file)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                new = {}
+                for name, measurement_unit in batch:
+                    name = name.strip()
+                    if name in seen:
+                        skipped += 1
+                        continue
+                    seen.add(name)
+                    new[name] = measurement_unit.strip()
+
+                existing = set(Ingredient.objects.filter(
+                    name__in=new).values_list('name', flat=True))
+                skipped += len(existing)
+                ingredients = [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in new.items()
+                    if name not in existing
+                ]
+                inserted += len(ingredients)
+                if not options['dry_run']:
+                    Ingredient.objects.bulk_create(
+                        ingredients, ignore_conflicts=True
+                    )
+
+        if inserted and not options['dry_run']:
+            bump_catalog_version('ingredients')
+
+        prefix = 'Пробный запуск. ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Добавлено ингредиентов: {inserted}, '
+            f'пропущено: {skipped}'
+        ))
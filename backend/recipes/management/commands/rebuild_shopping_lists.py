@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.shopping_list import repair_shopping_lists
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Команда для сверки списков покупок с покупками пользователей.
+    Вызов python manage.py rebuild_shopping_lists. Расходящиеся списки
+    пересоздаются; лучше запускать при низкой нагрузке, чтобы не
+    пересечься с изменением покупок тех же пользователей.
+    """
+
+    help = 'Сверка и исправление списков покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество пользователей, проверяемых за один проход.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        checked = repaired = 0
+        last_id = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            checked += len(batch)
+            repaired += repair_shopping_lists(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено пользователей: {checked}, исправлено списков: '
+            f'{repaired}.'
+        ))
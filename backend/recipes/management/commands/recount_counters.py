@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount_counters
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта счётчиков рецептов, избранного, покупок и
+    подписчиков. Вызов python manage.py recount_counters.
+    """
+
+    help = 'Пересчёт денормализованных счётчиков по таблицам связей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество объектов, обновляемых одним запросом.'
+        )
+
+    def handle(self, *args, **options):
+        recount_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта рейтингов рецептов «в тренде».
+    Вызов python manage.py refresh_rankings, по расписанию (например,
+    раз в час).
+    """
+
+    help = 'Пересчёт рейтингов рецептов для сортировки trending.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов, обновляемых одним запросом.'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        processed = refresh_rankings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги пересчитаны для {processed} рецептов.'
+        ))
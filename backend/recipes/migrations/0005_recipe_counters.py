@@ -0,0 +1,52 @@
+# Generated by Django 3.2.3 on 2026-10-17 05:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    counters = (
+        ('recipes', 'Recipe', 'author', 'users', 'User', 'recipes_count'),
+        ('recipes', 'Favorite', 'recipe', 'recipes', 'Recipe',
+         'favorites_count'),
+        ('recipes', 'ShoppingCart', 'recipe', 'recipes', 'Recipe',
+         'in_carts_count'),
+        ('users', 'Subscribe', 'author', 'users', 'User',
+         'subscribers_count'),
+    )
+    for app, model, relation, target_app, target, field in counters:
+        total = apps.get_model(app, model).objects.filter(
+            **{relation: OuterRef('pk')}
+        ).order_by().values(relation).annotate(
+            total=Count('pk')
+        ).values('total')
+        apps.get_model(target_app, target).objects.update(
+            **{field: Coalesce(Subquery(total), Value(0))}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_keyset_indexes'),
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Добавлен в избранное (кол.раз)'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Добавлен в список покупок (кол.раз)'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
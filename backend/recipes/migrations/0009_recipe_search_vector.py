@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import migrations
+
+# Столбец и индекс есть только в PostgreSQL: модель о них не знает,
+# поиск в других базах идёт по индексу в памяти (recipes.search).
+# Конфигурация текстового поиска берётся из RECIPE_SEARCH_CONFIG на момент
+# миграции; после её смены search_vector нужно пересчитать
+# (recipes.search.update_search для всех рецептов).
+ADD_SEARCH_VECTOR = (
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+    'USING GIN (search_vector)',
+    """
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector(%(config)s, recipes_recipe.name), 'A')
+        || setweight(to_tsvector(%(config)s, recipes_recipe.text), 'B')
+        || setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(recipes_ingredient.name, ' ')
+            FROM recipes_ingredientrecipe
+            JOIN recipes_ingredient
+                ON recipes_ingredient.id
+                = recipes_ingredientrecipe.ingredient_id
+            WHERE recipes_ingredientrecipe.recipe_id = recipes_recipe.id
+        ), '')), 'C')
+    """,
+)
+REMOVE_SEARCH_VECTOR = (
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+)
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            params = {'config': settings.RECIPE_SEARCH_CONFIG}
+            for statement in statements:
+                schema_editor.execute(statement, params)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgres(ADD_SEARCH_VECTOR),
+            run_on_postgres(REMOVE_SEARCH_VECTOR),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeRanking',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('trending_score', models.FloatField(default=0, verbose_name='Рейтинг «в тренде»')),
+                ('activity', models.FloatField(default=0, verbose_name='Активность с затуханием')),
+                ('favorites_seen', models.PositiveIntegerField(default=0, verbose_name='Избранное при последнем пересчёте')),
+                ('carts_seen', models.PositiveIntegerField(default=0, verbose_name='Покупки при последнем пересчёте')),
+                ('refreshed_at', models.DateTimeField(null=True, verbose_name='Дата пересчёта')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг рецепта',
+                'verbose_name_plural': 'Рейтинги рецептов',
+            },
+        ),
+        # Рейтинги существующих рецептов: уже накопленные избранное и
+        # покупки не считаются новой активностью.
+        migrations.RunSQL(
+            'INSERT INTO recipes_reciperanking (recipe_id, trending_score, '
+            'activity, favorites_seen, carts_seen) '
+            'SELECT id, 0, 0, favorites_count, in_carts_count '
+            'FROM recipes_recipe',
+            migrations.RunSQL.noop
+        ),
+        migrations.AddIndex(
+            model_name='reciperanking',
+            index=models.Index(fields=['-trending_score', '-recipe'], name='recipe_trending_idx'),
+        ),
+    ]
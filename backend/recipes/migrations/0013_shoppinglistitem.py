@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0012_reciperanking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Продукт в списке покупок',
+                'verbose_name_plural': 'Продукты в списках покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunSQL(
+            'INSERT INTO recipes_shoppinglistitem '
+            '(user_id, ingredient_id, amount) '
+            'SELECT c.user_id, ir.ingredient_id, SUM(ir.amount) '
+            'FROM recipes_shoppingcart c '
+            'JOIN recipes_ingredientrecipe ir ON ir.recipe_id = c.recipe_id '
+            'GROUP BY c.user_id, ir.ingredient_id',
+            migrations.RunSQL.noop
+        ),
+    ]
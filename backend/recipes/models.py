@@ -1,6 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import EmptyResultSet
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
+
+from recipes.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -32,6 +37,28 @@ class Ingredient(models.Model):
         return self.name
 
 
+class CatalogVersion(models.Model):
+    """Версия справочника или данных, построенных по таблицам: метка
+    времени последнего изменения в мс. Хранится в базе, чтобы изменение
+    из любого процесса, в том числе из команды, сразу видели все."""
+
+    name = models.CharField(
+        max_length=50,
+        primary_key=True,
+        verbose_name='Справочник'
+    )
+    version = models.BigIntegerField(
+        verbose_name='Версия'
+    )
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
 class Tag(models.Model):
     """Модель тега."""
 
@@ -59,6 +86,62 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборка рецептов с данными для отображения."""
+
+    def with_user_flags(self, user):
+        """Добавляет признаки избранного и списка покупок пользователя."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=models.BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=models.BooleanField()
+                )
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        )
+
+    def for_read(self, user):
+        """Все данные для RecipeReadSerializer за постоянное число запросов."""
+        return self.with_user_flags(user).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.with_is_subscribed(user)
+            ),
+            'tags',
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            )
+        )
+
+    def top_per_author(self, limit):
+        """Последние limit рецептов каждого автора одним запросом.
+
+        Рецепты нумеруются оконной функцией внутри автора, отбор по номеру
+        делается во внешнем запросе.
+        """
+        ranked = self.only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time', 'author'
+        ).annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('author'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        ))
+        try:
+            sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            return []
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE recipe_rank <= %s',
+            (*params, limit)
+        )
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -72,8 +155,16 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=ContentAddressedStorage(),
+        db_index=True,
         verbose_name='Картинка'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки'
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='IngredientRecipe',
@@ -99,11 +190,40 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлен в избранное (кол.раз)'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлен в список покупок (кол.раз)'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=('cooking_time', 'id'),
+                name='recipe_cooking_time_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_favorites_count_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -130,6 +250,12 @@ class IngredientRecipe(models.Model):
     class Meta:
         verbose_name = 'Ингредиент_Рецепт'
         verbose_name_plural = 'Ингредиенты_Рецепты'
+        indexes = (
+            models.Index(
+                fields=('ingredient', 'recipe'),
+                name='ingredient_recipe_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.recipe}: {self.ingredient}'
@@ -215,3 +341,118 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'У {self.user} в покупках: "{self.recipe}"'
+
+
+class SimilarRecipe(models.Model):
+    """Похожий рецепт: заранее рассчитанные соседи рецепта по
+    ингредиентам и тегам (команда build_similar_recipes)."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_for',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}'
+
+
+class RecipeRanking(models.Model):
+    """Рейтинг рецепта для ленты «в тренде»: добавления в избранное и в
+    покупки с затуханием во времени плюс свежесть рецепта.
+    Пересчитывается командой refresh_rankings."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт'
+    )
+    trending_score = models.FloatField(
+        default=0,
+        verbose_name='Рейтинг «в тренде»'
+    )
+    activity = models.FloatField(
+        default=0,
+        verbose_name='Активность с затуханием'
+    )
+    favorites_seen = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Избранное при последнем пересчёте'
+    )
+    carts_seen = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Покупки при последнем пересчёте'
+    )
+    refreshed_at = models.DateTimeField(
+        null=True,
+        verbose_name='Дата пересчёта'
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = (
+            models.Index(
+                fields=('-trending_score', '-recipe'),
+                name='recipe_trending_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe}: {self.trending_score:.2f}'
+
+
+class ShoppingListItem(models.Model):
+    """Строка списка покупок пользователя: сумма ингредиента по всем
+    рецептам в его покупках. Обновляется при изменении покупок и
+    ингредиентов рецептов (recipes.shopping_list)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество'
+    )
+
+    class Meta:
+        verbose_name = 'Продукт в списке покупок'
+        verbose_name_plural = 'Продукты в списках покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
@@ -0,0 +1,294 @@
+import threading
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from recipes.cache import (
+    get_catalog, get_catalog_version, get_catalog_versions,
+    increment_catalog_version
+)
+from recipes.models import IngredientRecipe, Recipe
+
+SEQUENCE_NAME = 'recipe_ingredients'
+CHANGE_KEY = 'recipe_ingredients:change:{}'
+EMPTY = array('I')
+# Ключ сортировки подбора: (не хватает, -совпало, -id) в одном uint64.
+ID_BITS = 32
+MATCHED_BITS = 16
+
+
+def find(postings, recipe_id):
+    """Позиция recipe_id в отсортированном массиве или None."""
+    position = bisect_left(postings, recipe_id)
+    if position < len(postings) and postings[position] == recipe_id:
+        return position
+    return None
+
+
+def with_recipe(postings, recipe_id):
+    """Копия массива с добавленным id: читатели старого массива не
+    увидят его в промежуточном состоянии."""
+    if find(postings, recipe_id) is not None:
+        return postings
+    position = bisect_left(postings, recipe_id)
+    return postings[:position] + array('I', (recipe_id,)) + (
+        postings[position:]
+    )
+
+
+def without_recipe(postings, recipe_id):
+    position = find(postings, recipe_id)
+    if position is None:
+        return postings
+    return postings[:position] + postings[position + 1:]
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс в памяти процесса: id ингредиента -> отсортированный
+    массив id рецептов с этим ингредиентом.
+
+    Номер последнего изменения хранится в базе (CatalogVersion), сами
+    изменения пишутся в кэш журналом. Процесс применяет к своему индексу
+    недостающие записи журнала и перестраивает индекс из базы, если
+    журнал неполон: например, при кэше в памяти процесса изменения
+    из других процессов в нём не видны.
+    Вместе с массивами хранится число ингредиентов каждого рецепта
+    (numpy-массив по id рецепта) для подбора рецептов по продуктам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = (None, None)
+
+    def invalidate(self):
+        self._built = (None, None)
+
+    def get_sequence(self):
+        return get_catalog_version(SEQUENCE_NAME)
+
+    def _write(self, change):
+        sequence = increment_catalog_version(SEQUENCE_NAME)
+        cache.set(
+            CHANGE_KEY.format(sequence), change,
+            timeout=settings.RECIPE_INGREDIENTS_LOG_TIMEOUT
+        )
+
+    def record_change(self, recipe_id, removed, added):
+        """Записывает в журнал изменение ингредиентов рецепта."""
+        if removed or added:
+            self._write((recipe_id, sorted(removed), sorted(added)))
+
+    def record_delete(self, recipe_id):
+        """Записывает в журнал удаление рецепта."""
+        self._write((recipe_id, None, ()))
+
+    def reset(self):
+        """Перестроить индекс во всех процессах (удалён ингредиент):
+        номер без записи в журнале."""
+        increment_catalog_version(SEQUENCE_NAME)
+
+    def _build(self):
+        postings = {}
+        ingredient_id = postings_of_ingredient = None
+        for row_ingredient_id, recipe_id in IngredientRecipe.objects.order_by(
+                'ingredient_id', 'recipe_id').values_list(
+                    'ingredient_id', 'recipe_id').iterator(chunk_size=10000):
+            if row_ingredient_id != ingredient_id:
+                ingredient_id = row_ingredient_id
+                postings_of_ingredient = postings[ingredient_id] = array('I')
+            if (not postings_of_ingredient
+                    or postings_of_ingredient[-1] != recipe_id):
+                postings_of_ingredient.append(recipe_id)
+        sizes = np.bincount(np.concatenate([
+            np.frombuffer(recipe_ids, dtype=np.uint32)
+            for recipe_ids in postings.values()
+        ] or [np.zeros(0, dtype=np.uint32)])).astype(np.int32)
+        return postings, sizes
+
+    def _catch_up(self, built_sequence, data, sequence):
+        """Применяет записи журнала после built_sequence; None, если
+        каких-то записей уже нет."""
+        if not built_sequence < sequence <= (
+                built_sequence + settings.RECIPE_INGREDIENTS_LOG_LIMIT):
+            return None
+        keys = [
+            CHANGE_KEY.format(number)
+            for number in range(built_sequence + 1, sequence + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        postings, sizes = data
+        postings = dict(postings)
+        last_id = max(recipe_id for recipe_id, *_ in changes.values())
+        sizes = np.pad(sizes, (0, max(0, last_id + 1 - len(sizes))))
+
+        def update(ingredient_id, recipe_id, change, delta):
+            recipe_ids = postings.get(ingredient_id, EMPTY)
+            changed = change(recipe_ids, recipe_id)
+            if changed is not recipe_ids:
+                postings[ingredient_id] = changed
+                sizes[recipe_id] += delta
+
+        for key in keys:
+            recipe_id, removed, added = changes[key]
+            if removed is None:
+                # Рецепт удалён: его ингредиенты ищутся по всем массивам.
+                removed = [
+                    ingredient_id
+                    for ingredient_id, recipe_ids in postings.items()
+                    if find(recipe_ids, recipe_id) is not None
+                ]
+            for ingredient_id in removed:
+                update(ingredient_id, recipe_id, without_recipe, -1)
+            for ingredient_id in added:
+                update(ingredient_id, recipe_id, with_recipe, 1)
+        return postings, sizes
+
+    def _get_data(self, sequence=None):
+        """Индекс для номера sequence (уже прочитанного в этом запросе)
+        или для текущего номера из базы."""
+        if sequence is None:
+            sequence = self.get_sequence()
+        built_sequence, data = self._built
+        if built_sequence == sequence:
+            return data
+        with self._lock:
+            built_sequence, data = self._built
+            sequence = self.get_sequence()
+            if built_sequence == sequence:
+                return data
+            if built_sequence is not None:
+                data = self._catch_up(built_sequence, data, sequence)
+            if data is None:
+                data = self._build()
+            self._built = (sequence, data)
+        return data
+
+    def match(self, include, exclude=()):
+        """Отсортированный список id рецептов со всеми ингредиентами
+        include и без ингредиентов exclude.
+
+        None, если даже самый редкий из ингредиентов include есть больше
+        чем в INGREDIENT_FILTER_MAX_IDS рецептах: такой список id не стоит
+        передавать в базу.
+        """
+        postings, _ = self._get_data()
+        matches = sorted(
+            (postings.get(ingredient_id, EMPTY)
+             for ingredient_id in set(include)),
+            key=len
+        )
+        if len(matches[0]) > settings.INGREDIENT_FILTER_MAX_IDS:
+            return None
+        others = matches[1:]
+        excluded = [
+            postings[ingredient_id] for ingredient_id in set(exclude)
+            if ingredient_id in postings
+        ]
+        return [
+            recipe_id for recipe_id in matches[0]
+            if all(find(other, recipe_id) is not None for other in others)
+            and all(find(other, recipe_id) is None for other in excluded)
+        ]
+
+    def rank_by_pantry(self, ingredient_ids, limit, sequence=None):
+        """Лучшие limit рецептов по имеющимся ингредиентам: список
+        (id рецепта, совпало, не хватает).
+
+        Рецепты с меньшим числом недостающих ингредиентов идут первыми,
+        при равенстве - с большим числом совпавших, затем новые. Совпадения
+        считаются одним проходом np.bincount по массивам ингредиентов,
+        лучшие выбираются np.argpartition без сортировки всех рецептов.
+        """
+        postings, sizes = self._get_data(sequence)
+        found = [
+            np.frombuffer(postings[ingredient_id], dtype=np.uint32)
+            for ingredient_id in set(ingredient_ids)
+            if len(postings.get(ingredient_id, EMPTY))
+        ]
+        if not found:
+            return []
+        matched = np.bincount(np.concatenate(found))
+        recipe_ids = np.flatnonzero(matched)
+        matched = matched[recipe_ids]
+        missing = sizes[recipe_ids] - matched
+        keys = (
+            (missing.astype(np.uint64) << (MATCHED_BITS + ID_BITS))
+            | ((2 ** MATCHED_BITS - 1 - matched).astype(np.uint64)
+               << ID_BITS)
+            | (2 ** ID_BITS - 1 - recipe_ids).astype(np.uint64)
+        )
+        if len(keys) > limit:
+            best = np.argpartition(keys, limit - 1)[:limit]
+        else:
+            best = np.arange(len(keys))
+        best = best[np.argsort(keys[best])]
+        return list(zip(
+            recipe_ids[best].tolist(), matched[best].tolist(),
+            missing[best].tolist()
+        ))
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def find_pantry_recipes(ingredient_ids, limit):
+    """Рецепты, которые можно приготовить из ингредиентов ingredient_ids,
+    с атрибутами matched (число совпавших) и missing (недостающие
+    ингредиенты из справочника), в порядке рейтинга."""
+    sequence, version = get_catalog_versions(SEQUENCE_NAME, 'ingredients')
+    ranked = recipe_ingredient_index.rank_by_pantry(
+        ingredient_ids, limit, sequence)
+    recipe_ids = [recipe_id for recipe_id, *_ in ranked]
+    missing = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids).exclude(
+                ingredient_id__in=ingredient_ids).order_by(
+                    'ingredient_id').values_list(
+                        'recipe_id', 'ingredient_id').distinct():
+        missing[recipe_id].append(ingredient_id)
+    catalog = {
+        item['id']: item for item in get_catalog('ingredients', version)
+    }
+    recipes = Recipe.objects.only(
+        'id', 'name', 'image', 'image_variants', 'cooking_time'
+    ).in_bulk(recipe_ids)
+    result = []
+    for recipe_id, matched, _ in ranked:
+        recipe = recipes.get(recipe_id)
+        if recipe is None:
+            continue
+        recipe.matched = matched
+        # Ингредиент мог быть удалён после чтения индекса.
+        recipe.missing = [
+            catalog[ingredient_id] for ingredient_id in missing[recipe_id]
+            if ingredient_id in catalog
+        ]
+        result.append(recipe)
+    return result
+
+
+def filter_by_ingredients(queryset, include=(), exclude=()):
+    """Рецепты со всеми ингредиентами include и без ингредиентов exclude.
+
+    Выборка по include строится по индексу в памяти; если ингредиенты
+    слишком распространены, и для исключений без include, условия
+    проверяются подзапросами EXISTS по индексу (ингредиент, рецепт).
+    """
+    recipe_ids = (
+        recipe_ingredient_index.match(include, exclude) if include else None
+    )
+    if recipe_ids is not None:
+        return queryset.filter(id__in=recipe_ids)
+    for ingredient_id in set(include):
+        queryset = queryset.filter(Exists(IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk'), ingredient_id=ingredient_id)))
+    if exclude:
+        queryset = queryset.exclude(Exists(IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk'), ingredient_id__in=exclude)))
+    return queryset
@@ -0,0 +1,97 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import Recipe, RecipeRanking
+
+HOUR = 60 * 60
+
+
+def decay(hours):
+    """Множитель затухания за hours часов."""
+    return 0.5 ** (hours / settings.TRENDING_HALF_LIFE_HOURS)
+
+
+def recency_score(age_hours):
+    return settings.TRENDING_RECENCY_WEIGHT * decay(age_hours)
+
+
+def create_ranking(recipe):
+    """Рейтинг нового рецепта: только свежесть."""
+    RecipeRanking.objects.create(
+        recipe=recipe,
+        trending_score=recency_score(0),
+        refreshed_at=recipe.pub_date
+    )
+
+
+def refresh_rankings(batch_size=1000, now=None):
+    """Пересчитывает рейтинги всех рецептов пачками по id.
+
+    Добавления в избранное и в покупки берутся как прирост
+    денормализованных счётчиков с прошлого пересчёта, поэтому таблицы
+    избранного и покупок не читаются. Накопленная активность затухает
+    вдвое за TRENDING_HALF_LIFE_HOURS, так же затухает вклад свежести.
+    Возвращает число пересчитанных рецептов.
+    """
+    now = now or timezone.now()
+    recipes = Recipe.objects.order_by('id').values_list(
+        'id', 'favorites_count', 'in_carts_count', 'pub_date',
+        'ranking__activity', 'ranking__favorites_seen',
+        'ranking__carts_seen', 'ranking__refreshed_at'
+    )
+    processed = 0
+    last_id = 0
+    while True:
+        batch = list(recipes.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        processed += len(batch)
+        (ids, favorites, carts, pub_dates,
+         activity, favorites_seen, carts_seen, refreshed) = zip(*batch)
+        favorites = np.array(favorites, dtype=np.float64)
+        carts = np.array(carts, dtype=np.float64)
+        # Рецепты без рейтинга считаются пересчитанными в момент
+        # публикации с нулевой активностью.
+        since = np.array([
+            ((now - (refreshed_at or pub_date)).total_seconds() / HOUR)
+            for refreshed_at, pub_date in zip(refreshed, pub_dates)
+        ])
+        age = np.array([
+            (now - pub_date).total_seconds() / HOUR for pub_date in pub_dates
+        ])
+        activity = np.array(
+            [value or 0 for value in activity], dtype=np.float64
+        ) * decay(np.maximum(since, 0)) + (
+            settings.TRENDING_FAVORITE_WEIGHT * np.maximum(
+                favorites - np.array(
+                    [value or 0 for value in favorites_seen]), 0)
+            + settings.TRENDING_CART_WEIGHT * np.maximum(
+                carts - np.array([value or 0 for value in carts_seen]), 0)
+        )
+        scores = activity + recency_score(np.maximum(age, 0))
+        rankings = [
+            RecipeRanking(
+                recipe_id=recipe_id,
+                trending_score=float(score),
+                activity=float(recipe_activity),
+                favorites_seen=int(favorites_count),
+                carts_seen=int(carts_count),
+                refreshed_at=now
+            )
+            for recipe_id, score, recipe_activity, favorites_count,
+            carts_count in zip(ids, scores, activity, favorites, carts)
+        ]
+        with transaction.atomic():
+            RecipeRanking.objects.bulk_create(
+                (ranking for ranking, seen in zip(rankings, refreshed)
+                 if seen is None),
+                ignore_conflicts=True
+            )
+            RecipeRanking.objects.bulk_update(rankings, (
+                'trending_score', 'activity', 'favorites_seen',
+                'carts_seen', 'refreshed_at'
+            ))
+    return processed
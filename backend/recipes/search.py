@@ -0,0 +1,298 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+
+from recipes.cache import (
+    bump_catalog_version, get_catalog, get_catalog_version
+)
+from recipes.models import IngredientRecipe, Recipe
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е').strip()
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Сначала возвращаются совпадения по началу названия, затем по
+    подстроке, затем нечёткие совпадения по триграммам. Строится по
+    справочнику ингредиентов из кэша.
+
+    Версия справочника читается из базы не чаще раза в
+    INGREDIENTS_VERSION_CHECK_INTERVAL секунд: изменения из других
+    процессов видны с этой задержкой, изменения в своём процессе - сразу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = (None, None)
+        self._checked = (None, 0)
+
+    def invalidate(self):
+        self._built = (None, None)
+        self._checked = (None, 0)
+
+    def get_version(self):
+        """Версия справочника, прочитанная не раньше чем
+        INGREDIENTS_VERSION_CHECK_INTERVAL секунд назад."""
+        version, checked_at = self._checked
+        now = time.monotonic()
+        if (version is None or now - checked_at
+                >= settings.INGREDIENTS_VERSION_CHECK_INTERVAL):
+            version = get_catalog_version('ingredients')
+            self._checked = (version, now)
+        return version
+
+    def _build(self, version):
+        items = sorted(
+            get_catalog('ingredients', version),
+            key=lambda item: normalize(item['name'])
+        )
+        names = [normalize(item['name']) for item in items]
+        postings = defaultdict(lambda: array('I'))
+        sizes = array('H')
+        for position, name in enumerate(names):
+            name_trigrams = trigrams(name)
+            sizes.append(len(name_trigrams))
+            for trigram in name_trigrams:
+                postings[trigram].append(position)
+        return items, names, dict(postings), sizes
+
+    def _get_data(self, version=None):
+        """Индекс перестраивается при смене версии справочника."""
+        if version is None:
+            version = self.get_version()
+        built_version, data = self._built
+        if built_version != version:
+            with self._lock:
+                built_version, data = self._built
+                if built_version != version:
+                    data = self._build(version)
+                    self._built = (version, data)
+        return data
+
+    def search(self, query, version=None):
+        """Ингредиенты по запросу; version - уже прочитанная версия
+        справочника."""
+        items, names, postings, sizes = self._get_data(version)
+        query = normalize(query)
+        if not query:
+            return items
+
+        start = bisect_left(names, query)
+        end = start
+        while end < len(names) and names[end].startswith(query):
+            end += 1
+        found = list(range(start, end))
+
+        query_trigrams = trigrams(query)
+        candidates = Counter()
+        for trigram in query_trigrams:
+            candidates.update(postings.get(trigram, ()))
+
+        substring = sorted(
+            (names[position].find(query), names[position], position)
+            for position in (
+                candidates if len(query) > 2 else range(len(names))
+            )
+            if not start <= position < end and query in names[position]
+        )
+        found.extend(position for _, _, position in substring)
+
+        fuzzy_limit = settings.INGREDIENTS_FUZZY_LIMIT - len(found)
+        if fuzzy_limit > 0:
+            seen = set(found)
+            similar = []
+            for position, shared in candidates.items():
+                similarity = shared / (
+                    len(query_trigrams) + sizes[position] - shared
+                )
+                if (position not in seen
+                        and similarity >= settings.INGREDIENTS_SIMILARITY):
+                    similar.append((-similarity, names[position], position))
+            found.extend(
+                position for _, _, position in sorted(similar)[:fuzzy_limit]
+            )
+        return [items[position] for position in found]
+
+
+ingredient_index = IngredientIndex()
+
+
+WORD_RE = re.compile(r'\w+')
+# Окончания в порядке убывания длины: отсекается первое подходящее.
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ов', 'ев',
+    'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю', 'ию', 'ия', 'ии',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+# Веса полей как у ts_rank по умолчанию для A, B и C.
+FIELD_WEIGHTS = (1.0, 0.4, 0.2)
+
+
+def stem(word):
+    """Упрощённый стеммер: отсекает типичное окончание слова."""
+    for ending in ENDINGS:
+        if (word.endswith(ending)
+                and len(word) - len(ending) >= MIN_STEM_LENGTH):
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(normalize(text))]
+
+
+class RecipeTextIndex:
+    """Обратный индекс рецептов в памяти процесса для баз без
+    полнотекстового поиска (SQLite): основа слова -> {id рецепта: вес}.
+
+    Ищутся рецепты, содержащие все слова запроса; вес - сумма весов полей
+    (название, описание, ингредиенты), в которых встретилось слово.
+    Индекс перестраивается после изменения рецептов.
+    """
+
+    version_key = 'recipe_search'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = (None, None)
+
+    def invalidate(self):
+        bump_catalog_version(self.version_key)
+
+    def _build(self):
+        postings = defaultdict(dict)
+
+        def add(recipe_id, text, weight):
+            for token in set(tokenize(text)):
+                scores = postings[token]
+                scores[recipe_id] = scores.get(recipe_id, 0) + weight
+
+        name_weight, text_weight, ingredient_weight = FIELD_WEIGHTS
+        for recipe_id, name, text in Recipe.objects.values_list(
+                'id', 'name', 'text').iterator():
+            add(recipe_id, name, name_weight)
+            add(recipe_id, text, text_weight)
+        for recipe_id, name in IngredientRecipe.objects.values_list(
+                'recipe_id', 'ingredient__name').iterator():
+            add(recipe_id, name, ingredient_weight)
+        return dict(postings)
+
+    def _get_postings(self):
+        version = get_catalog_version(self.version_key)
+        built_version, postings = self._built
+        if built_version != version:
+            with self._lock:
+                built_version, postings = self._built
+                if built_version != version:
+                    postings = self._build()
+                    self._built = (version, postings)
+        return postings
+
+    def search(self, tokens):
+        """Список (id рецепта, вес) по убыванию веса."""
+        postings = self._get_postings()
+        matches = sorted(
+            (postings.get(token, {}) for token in set(tokens)), key=len
+        )
+        ranks = dict(matches[0])
+        for scores in matches[1:]:
+            ranks = {
+                recipe_id: rank + scores[recipe_id]
+                for recipe_id, rank in ranks.items() if recipe_id in scores
+            }
+        return sorted(ranks.items(), key=lambda item: (-item[1], -item[0]))
+
+
+recipe_text_index = RecipeTextIndex()
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+SEARCH_VECTOR_SQL = """
+UPDATE recipes_recipe SET search_vector =
+    setweight(to_tsvector(%(config)s, recipes_recipe.name), 'A')
+    || setweight(to_tsvector(%(config)s, recipes_recipe.text), 'B')
+    || setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(recipes_ingredient.name, ' ')
+        FROM recipes_ingredientrecipe
+        JOIN recipes_ingredient
+            ON recipes_ingredient.id = recipes_ingredientrecipe.ingredient_id
+        WHERE recipes_ingredientrecipe.recipe_id = recipes_recipe.id
+    ), '')), 'C')
+"""
+
+
+def update_search(recipe_ids=None, ingredient_id=None):
+    """Обновляет поисковые данные рецептов после записи.
+
+    В PostgreSQL пересчитывается столбец search_vector у указанных
+    рецептов (или у рецептов с ингредиентом ingredient_id), для других
+    баз индекс в памяти помечается устаревшим.
+    """
+    if not uses_postgres():
+        recipe_text_index.invalidate()
+        return
+    params = {'config': settings.RECIPE_SEARCH_CONFIG}
+    if ingredient_id is not None:
+        condition = (
+            'WHERE id IN (SELECT recipe_id FROM recipes_ingredientrecipe '
+            'WHERE ingredient_id = %(ingredient_id)s)'
+        )
+        params['ingredient_id'] = ingredient_id
+    else:
+        condition = 'WHERE id = ANY(%(recipe_ids)s)'
+        params['recipe_ids'] = list(recipe_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_VECTOR_SQL + condition, params)
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, с весом search_rank, по убыванию
+    веса. PostgreSQL ищет по search_vector (индекс GIN), другие базы -
+    по индексу в памяти процесса."""
+    if not tokenize(query):
+        return queryset
+    if uses_postgres():
+        tsquery = 'plainto_tsquery(%s, %s)'
+        params = (settings.RECIPE_SEARCH_CONFIG, query)
+        return queryset.filter(RawSQL(
+            f'recipes_recipe.search_vector @@ {tsquery}', params,
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank(recipes_recipe.search_vector, {tsquery})'
+            '::double precision',
+            params, output_field=FloatField()
+        )).order_by('-search_rank', '-id')
+
+    found = recipe_text_index.search(tokenize(query))[
+        :settings.RECIPE_SEARCH_FALLBACK_LIMIT]
+    if not found:
+        return queryset.none()
+    recipe_ids = [recipe_id for recipe_id, _ in found]
+    return queryset.filter(id__in=recipe_ids).annotate(
+        search_rank=Case(
+            *(When(id=recipe_id, then=Value(rank))
+              for recipe_id, rank in found),
+            output_field=FloatField()
+        )
+    ).order_by('-search_rank', '-id')
@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from recipes.models import IngredientRecipe, ShoppingCart, ShoppingListItem
+
+
+def get_tables():
+    quote = connection.ops.quote_name
+    return {
+        'items': quote(ShoppingListItem._meta.db_table),
+        'cart': quote(ShoppingCart._meta.db_table),
+        'ingredients': quote(IngredientRecipe._meta.db_table),
+    }
+
+
+def upsert(select, params):
+    """Прибавляет к строкам списков покупок количества из select
+    (user_id, ingredient_id, amount) одним запросом."""
+    tables = get_tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {tables["items"]} (user_id, ingredient_id, amount) '
+            f'{select.format(**tables)} '
+            'ON CONFLICT (user_id, ingredient_id) DO UPDATE SET '
+            f'amount = {tables["items"]}.amount + excluded.amount',
+            params
+        )
+
+
+def delete_empty(condition, params):
+    """Удаляет строки, количество в которых стало нулевым."""
+    tables = get_tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {tables["items"]} WHERE amount <= 0 '
+            f'AND {condition.format(**tables)}',
+            params
+        )
+
+
+def add_recipes(user_id, recipe_ids, sign=1):
+    """Прибавляет к списку покупок пользователя ингредиенты рецептов;
+    с sign=-1 вычитает."""
+    if not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    upsert(
+        'SELECT %s, ingredient_id, %s * SUM(amount) FROM {ingredients} '
+        f'WHERE recipe_id IN ({placeholders}) GROUP BY ingredient_id',
+        (user_id, sign, *recipe_ids)
+    )
+    if sign < 0:
+        delete_empty('user_id = %s', (user_id,))
+
+
+def remove_recipes(user_id, recipe_ids):
+    add_recipes(user_id, recipe_ids, -1)
+
+
+def change_ingredients(recipe_id, before, after):
+    """Переносит изменение ингредиентов рецепта (словари
+    {id ингредиента: количество}) в списки всех пользователей, у
+    которых рецепт в покупках."""
+    deltas = [
+        (ingredient_id, after.get(ingredient_id, 0)
+         - before.get(ingredient_id, 0))
+        for ingredient_id in sorted(before.keys() | after.keys())
+    ]
+    deltas = [(ingredient_id, delta) for ingredient_id, delta in deltas
+              if delta]
+    if not deltas:
+        return
+    values = ' UNION ALL '.join(
+        ['SELECT CAST(%s AS INTEGER) AS ingredient_id, '
+         'CAST(%s AS INTEGER) AS amount'] * len(deltas)
+    )
+    upsert(
+        'SELECT cart.user_id, deltas.ingredient_id, deltas.amount '
+        f'FROM {{cart}} cart, ({values}) deltas '
+        'WHERE cart.recipe_id = %s',
+        (*(value for delta in deltas for value in delta), recipe_id)
+    )
+    decreased = [ingredient_id for ingredient_id, delta in deltas
+                 if delta < 0]
+    if decreased:
+        placeholders = ', '.join(['%s'] * len(decreased))
+        delete_empty(
+            f'ingredient_id IN ({placeholders}) AND user_id IN '
+            '(SELECT user_id FROM {cart} WHERE recipe_id = %s)',
+            (*decreased, recipe_id)
+        )
+
+
+def get_expected(user_ids):
+    """Списки покупок пользователей, посчитанные заново по покупкам."""
+    expected = defaultdict(dict)
+    for user_id, ingredient_id, amount in ShoppingCart.objects.filter(
+            user_id__in=user_ids,
+            recipe__ingredientrecipe__isnull=False).values_list(
+                'user_id', 'recipe__ingredientrecipe__ingredient_id',
+                'recipe__ingredientrecipe__amount'):
+        items = expected[user_id]
+        items[ingredient_id] = items.get(ingredient_id, 0) + amount
+    return expected
+
+
+def repair_shopping_lists(user_ids):
+    """Сверяет списки покупок пользователей с покупками и пересоздаёт
+    расходящиеся. Возвращает число исправленных списков."""
+    expected = get_expected(user_ids)
+    current = defaultdict(dict)
+    for user_id, ingredient_id, amount in ShoppingListItem.objects.filter(
+            user_id__in=user_ids).values_list(
+                'user_id', 'ingredient_id', 'amount'):
+        current[user_id][ingredient_id] = amount
+    broken = [
+        user_id for user_id in user_ids
+        if expected.get(user_id, {}) != current.get(user_id, {})
+    ]
+    if broken:
+        with transaction.atomic():
+            ShoppingListItem.objects.filter(user_id__in=broken).delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for user_id in broken
+                for ingredient_id, amount in expected.get(
+                    user_id, {}).items()
+            )
+    return len(broken)
@@ -0,0 +1,188 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete
+)
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from recipes.cache import bump_catalog_version
+from recipes.counters import get_counter, update_counters
+from recipes.images import schedule_derivatives, schedule_release
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag
+)
+from recipes.postings import recipe_ingredient_index
+from recipes.rankings import create_ranking
+from recipes.search import ingredient_index, update_search
+from recipes.shopping_list import (
+    add_recipes, change_ingredients, remove_recipes
+)
+from users.models import Subscribe
+
+# Ингредиенты рецепта изменены (пакетно, в обход сигналов моделей).
+# Аргументы: recipe_id, before и after - словари
+# {id ингредиента: количество} до и после изменения.
+ingredients_changed = Signal()
+
+
+def get_ingredient_amounts(recipe_ids):
+    amounts = {recipe_id: {} for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id, amount in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient_id', 'amount'):
+        recipe_amounts = amounts[recipe_id]
+        recipe_amounts[ingredient_id] = (
+            recipe_amounts.get(ingredient_id, 0) + amount
+        )
+    return amounts
+
+
+def touch_recipes(recipe_ids):
+    """Обновляет updated_at рецептов, строки ингредиентов или тегов которых
+    изменены в обход RecipeSerializer: от него зависят ETag рецепта."""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now())
+
+
+@contextmanager
+def track_ingredients(recipe_ids):
+    """Отправляет ingredients_changed для рецептов, ингредиенты которых
+    изменились внутри блока (правка в админке)."""
+    recipe_ids = [recipe_id for recipe_id in recipe_ids if recipe_id]
+    before = get_ingredient_amounts(recipe_ids)
+    yield
+    after = get_ingredient_amounts(recipe_ids)
+    changed = [
+        recipe_id for recipe_id in recipe_ids
+        if before[recipe_id] != after[recipe_id]
+    ]
+    if changed:
+        touch_recipes(changed)
+    for recipe_id in changed:
+        ingredients_changed.send(
+            sender=Recipe, recipe_id=recipe_id,
+            before=before[recipe_id], after=after[recipe_id]
+        )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    bump_catalog_version('ingredients')
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    bump_catalog_version('tags')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        relation = get_counter(sender)[1]
+        update_counters(sender, (getattr(instance, f'{relation}_id'),), 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscribe)
+def decrement_counter(sender, instance, **kwargs):
+    relation = get_counter(sender)[1]
+    update_counters(sender, (getattr(instance, f'{relation}_id'),), -1)
+
+
+@receiver(post_save, sender=Recipe)
+def add_ranking(sender, instance, created, **kwargs):
+    if created:
+        create_ranking(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def process_image(sender, instance, **kwargs):
+    if instance.image and (
+            instance.image_variants.get('source') != instance.image.name):
+        schedule_derivatives(instance.pk)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    image = instance.__dict__.get('image')
+    instance._loaded_image = getattr(image, 'name', image)
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    if 'image' not in instance.__dict__:
+        return
+    if instance._loaded_image and (
+            instance._loaded_image != instance.image.name):
+        schedule_release(instance._loaded_image)
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    schedule_release(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(sender, instance, **kwargs):
+    update_search((instance.pk,))
+
+
+@receiver(ingredients_changed)
+def update_ingredients_search(sender, recipe_id, **kwargs):
+    update_search((recipe_id,))
+
+
+@receiver(post_save, sender=Ingredient)
+def update_renamed_ingredient_search(sender, instance, created, **kwargs):
+    if not created:
+        update_search(ingredient_id=instance.pk)
+
+
+@receiver(ingredients_changed)
+def update_ingredient_postings(sender, recipe_id, before, after, **kwargs):
+    removed = before.keys() - after.keys()
+    added = after.keys() - before.keys()
+    transaction.on_commit(
+        lambda: recipe_ingredient_index.record_change(
+            recipe_id, removed, added)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_postings(sender, instance, **kwargs):
+    recipe_id = instance.pk
+    transaction.on_commit(
+        lambda: recipe_ingredient_index.record_delete(recipe_id)
+    )
+
+
+@receiver(post_delete, sender=Ingredient)
+def reset_ingredient_postings(sender, **kwargs):
+    transaction.on_commit(recipe_ingredient_index.reset)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        add_recipes(instance.user_id, (instance.recipe_id,))
+
+
+# pre_delete: при удалении рецепта каскадом его ингредиенты ещё не
+# удалены, и их можно вычесть из списков покупок.
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    remove_recipes(instance.user_id, (instance.recipe_id,))
+
+
+@receiver(ingredients_changed)
+def update_shopping_lists(sender, recipe_id, before, after, **kwargs):
+    change_ingredients(recipe_id, before, after)
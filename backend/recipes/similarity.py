@@ -0,0 +1,185 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+from scipy import sparse
+
+from recipes.models import IngredientRecipe, Recipe, SimilarRecipe, TagRecipe
+
+
+def load_pairs(model, field):
+    """Массивы (id рецепта, id признака) из таблицы связи."""
+    pairs = np.fromiter(
+        (value for row in model.objects.values_list(
+            'recipe_id', field).iterator(chunk_size=10000) for value in row),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def to_rows(recipe_ids, ids):
+    """Строки матрицы для id рецептов; рецепты, которых нет в матрице
+    (созданы после её построения), пропускаются."""
+    ids = np.array(sorted(ids), dtype=np.int64)
+    rows = np.searchsorted(recipe_ids, ids)
+    found = rows < len(recipe_ids)
+    found[found] = recipe_ids[rows[found]] == ids[found]
+    return rows[found]
+
+
+def build_matrix(max_df):
+    """Матрица рецепт × признак (ингредиенты и теги) с весами TF-IDF и
+    строками единичной длины: скалярное произведение строк - косинусное
+    сходство рецептов.
+
+    Признаки, которые есть больше чем в max_df рецептах (соль, вода,
+    популярные теги), отбрасываются: они почти не отличают рецепты, а
+    произведение матриц из-за них становится плотным.
+    Возвращает (id рецептов по строкам, матрица).
+    """
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list('id', flat=True).iterator(),
+        dtype=np.int64
+    )
+    ingredient_recipes, ingredients = load_pairs(
+        IngredientRecipe, 'ingredient_id')
+    tag_recipes, tags = load_pairs(TagRecipe, 'tag_id')
+    offset = ingredients.max() + 1 if len(ingredients) else 0
+    pair_ids = np.concatenate((ingredient_recipes, tag_recipes))
+    rows = np.searchsorted(recipe_ids, pair_ids)
+    columns = np.concatenate((ingredients, tags + offset))
+    # Связи рецептов, созданных после чтения списка рецептов.
+    known = rows < len(recipe_ids)
+    known[known] = recipe_ids[rows[known]] == pair_ids[known]
+    rows, columns = rows[known], columns[known]
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(len(recipe_ids), columns.max() + 1 if len(columns) else 0)
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+
+    frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    weights = (
+        np.log((1 + len(recipe_ids)) / (1 + frequency)) + 1
+    ).astype(np.float32)
+    weights[frequency > max_df] = 0
+    matrix = matrix @ sparse.diags(weights)
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return recipe_ids, sparse.diags(1 / norms).astype(np.float32) @ matrix
+
+
+def similarities(matrix, transposed, rows):
+    """Для каждой строки из rows: (строка, строки других рецептов с
+    ненулевым сходством, сходство)."""
+    products = (matrix[rows] @ transposed).tocsr()
+    for position, row in enumerate(rows):
+        start, end = products.indptr[position:position + 2]
+        columns = products.indices[start:end]
+        scores = products.data[start:end]
+        other = columns != row
+        yield row, columns[other], scores[other]
+
+
+def top(columns, scores, top_k):
+    """top_k лучших соседей по убыванию сходства."""
+    if len(scores) > top_k:
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        columns, scores = columns[best], scores[best]
+    order = np.lexsort((columns, -scores))
+    return columns[order], scores[order]
+
+
+def save_neighbours(recipe_ids, neighbours):
+    """Заменяет соседей рецептов пачки: {строка: (строки, сходство)}."""
+    batch_ids = [int(recipe_ids[row]) for row in neighbours]
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=batch_ids).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(
+                recipe_id=int(recipe_ids[row]),
+                similar_id=int(recipe_ids[column]),
+                score=float(score)
+            )
+            for row, (columns, scores) in neighbours.items()
+            for column, score in zip(columns, scores)
+        )
+
+
+def find_affected(recipe_ids, changed, candidates, top_k, batch_size):
+    """Строки рецептов, чьи списки соседей могут измениться после
+    изменения рецептов changed.
+
+    Это рецепты, в списках которых есть изменённые, и рецепты, для
+    которых сходство с изменённым (candidates: {строка: сходство}) выше
+    худшего соседа в их списке или список неполон.
+    """
+    changed_ids = [int(recipe_ids[row]) for row in changed]
+    affected_ids = set(SimilarRecipe.objects.filter(
+        similar_id__in=changed_ids).values_list('recipe_id', flat=True))
+    rows = sorted(candidates)
+    for start in range(0, len(rows), batch_size):
+        chunk = {int(recipe_ids[row]): row for row in rows[
+            start:start + batch_size]}
+        thresholds = {
+            recipe_id: lowest if count >= top_k else 0
+            for recipe_id, count, lowest in SimilarRecipe.objects.filter(
+                recipe_id__in=chunk
+            ).values('recipe_id').annotate(
+                count=Count('id'), lowest=Min('score')
+            ).values_list('recipe_id', 'count', 'lowest')
+        }
+        affected_ids.update(
+            recipe_id for recipe_id, row in chunk.items()
+            if candidates[row] > thresholds.get(recipe_id, 0)
+        )
+    return to_rows(recipe_ids, affected_ids)
+
+
+def build_similar_recipes(top_k, batch_size, max_df, changed_since=None):
+    """Пересчитывает похожие рецепты пачками по batch_size рецептов.
+
+    Без changed_since пересчитываются все рецепты. С changed_since -
+    только рецепты, изменённые после этого времени, и рецепты, на
+    списки соседей которых они влияют (сходство симметрично, поэтому
+    достаточно посчитать строки изменённых рецептов). Веса признаков
+    при этом берутся текущие, старые списки остальных рецептов не
+    пересчитываются. Возвращает число пересчитанных рецептов.
+    """
+    recipe_ids, matrix = build_matrix(max_df)
+    transposed = matrix.T.tocsr()
+
+    def process(rows, candidates=None):
+        for start in range(0, len(rows), batch_size):
+            neighbours = {}
+            for row, columns, scores in similarities(
+                    matrix, transposed, rows[start:start + batch_size]):
+                neighbours[row] = top(columns, scores, top_k)
+                if candidates is not None:
+                    for column, score in zip(
+                            columns.tolist(), scores.tolist()):
+                        candidates[column] = max(
+                            candidates.get(column, 0), score)
+            save_neighbours(recipe_ids, neighbours)
+
+    if changed_since is None:
+        process(np.arange(len(recipe_ids)))
+        return len(recipe_ids)
+
+    changed = to_rows(recipe_ids, Recipe.objects.filter(
+        updated_at__gt=changed_since).values_list('id', flat=True))
+    candidates = {}
+    process(changed, candidates)
+    changed_rows = set(changed.tolist())
+    affected = [
+        row for row in find_affected(
+            recipe_ids, changed,
+            {row: score for row, score in candidates.items()
+             if row not in changed_rows},
+            top_k, batch_size
+        ).tolist()
+        if row not in changed_rows
+    ]
+    process(np.array(affected, dtype=np.int64))
+    return len(changed) + len(affected)
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла — хэш его содержимого.
+
+    recipes/images/temp.png -> recipes/images/ab/cd/abcd...ef.png.
+    Одинаковые картинки хранятся одним файлом: если файл с таким хэшем
+    уже есть, повторная запись пропускается. Каталоги делятся по первым
+    символам хэша, чтобы в одном каталоге не копились тысячи файлов.
+    """
+
+    hash_algorithm = 'sha256'
+    shard_levels = 2
+    shard_width = 2
+
+    def get_hashed_name(self, name, content):
+        digest = hashlib.new(self.hash_algorithm)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        shards = [
+            digest[level * self.shard_width:(level + 1) * self.shard_width]
+            for level in range(self.shard_levels)
+        ]
+        return posixpath.join(directory, *shards, digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            # Время изменения обновляется, чтобы сборщик мусора не удалил
+            # файл, на который вот-вот сошлётся новая запись.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
@@ -0,0 +1,164 @@
+import itertools
+import shutil
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag
+)
+from recipes.postings import recipe_ingredient_index
+from recipes.search import ingredient_index
+from users.models import Subscribe
+
+User = get_user_model()
+
+_counter = itertools.count()
+
+PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAAD'
+    'UlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+class Seeder:
+    """Наполняет базу типовыми данными в нужном объёме."""
+
+    def __init__(self, user):
+        self.user = user
+        self.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}',
+                color=f'#0000{number:02d}',
+                slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(10)
+        )
+        self.ingredients = list(Ingredient.objects.order_by('id'))
+
+    def author(self):
+        number = next(_counter)
+        return User.objects.create_user(
+            username=f'author{number}',
+            email=f'author{number}@foodgram.ru',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='Pass12345'
+        )
+
+    def recipe(self, author):
+        number = next(_counter)
+        recipe = Recipe.objects.create(
+            name=f'Рецепт {number}',
+            text='Описание',
+            image='recipes/images/temp.png',
+            cooking_time=10,
+            author=author
+        )
+        recipe.tags.set(self.tags)
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=5)
+            for ingredient in self.ingredients[:5]
+        )
+        return recipe
+
+    def seed(self, authors=2, recipes_per_author=2):
+        """Добавляет авторов с рецептами, подписки, избранное, покупки."""
+        for _ in range(authors):
+            author = self.author()
+            Subscribe.objects.create(user=self.user, author=author)
+            for _ in range(recipes_per_author):
+                recipe = self.recipe(author)
+                Favorite.objects.create(user=self.user, recipe=recipe)
+                ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    """Файлы, которые создают тесты, не попадают в каталог media проекта.
+    Картинка рецептов Seeder копируется во временный каталог."""
+    image = 'recipes/images/temp.png'
+    target = tmp_path / image
+    target.parent.mkdir(parents=True)
+    shutil.copy(settings.BASE_DIR / 'media' / image, target)
+    settings.MEDIA_ROOT = tmp_path
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    ingredient_index.invalidate()
+    recipe_ingredient_index.invalidate()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        username='user',
+        email='user@foodgram.ru',
+        first_name='Пользователь',
+        last_name='Тестовый',
+        password='Pass12345'
+    )
+
+
+@pytest.fixture
+def seeder(db, user):
+    return Seeder(user)
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def count_queries():
+    """Возвращает число SQL-запросов, выполненных при вызове клиента."""
+
+    def count(client, method, url, expected_status, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(client, method)(url, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        assert response.status_code == expected_status, response.content
+        return len(context)
+
+    return count
+
+
+@pytest.fixture
+def admin_client(django_user_model, client):
+    client.force_login(django_user_model.objects.create_superuser(
+        username='admin', email='admin@foodgram.ru', password='Pass12345'))
+    return client
+
+
+@pytest.fixture
+def recipe_payload(seeder):
+    """Данные нового рецепта с картинкой base64 и ингредиентами."""
+
+    def payload(ingredients):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': PNG,
+            'tags': [tag.id for tag in seeder.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in ingredients
+            ],
+        }
+
+    return payload
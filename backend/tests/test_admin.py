@@ -0,0 +1,19 @@
+import pytest
+
+from recipes.models import Favorite
+
+
+@pytest.mark.django_db
+def test_admin_export_csv(seeder, admin_client):
+    seeder.seed(authors=2, recipes_per_author=2)
+
+    response = admin_client.post('/admin/recipes/favorite/', {
+        'action': 'export_csv',
+        'select_across': 1,
+        '_selected_action': Favorite.objects.values_list('pk', flat=True)[:1],
+    })
+
+    assert response.streaming
+    rows = b''.join(response.streaming_content).decode().splitlines()
+    assert rows[0] == 'pk,user_id,recipe_id'
+    assert len(rows) == Favorite.objects.count() + 1
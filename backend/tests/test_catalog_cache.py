@@ -0,0 +1,60 @@
+import types
+from io import StringIO
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+
+from recipes import cache, search
+from recipes.models import Ingredient
+
+
+@pytest.fixture
+def other_process_import(monkeypatch, tmp_path):
+    """Импорт ингредиентов командой в другом процессе: со своим кэшем
+    в памяти, которого не видит сервер."""
+
+    def run(*rows):
+        path = tmp_path / 'ingredients.csv'
+        path.write_text(
+            ''.join(f'{name},{unit}\n' for name, unit in rows),
+            encoding='utf-8'
+        )
+        with monkeypatch.context() as patch:
+            patch.setattr(cache, 'cache', LocMemCache('other-process', {}))
+            call_command('ingredients_import', '--path', str(path),
+                         stdout=StringIO())
+
+    return run
+
+
+@pytest.mark.django_db
+def test_import_in_another_process_reaches_server(
+        seeder, user, user_client, other_process_import, monkeypatch,
+        settings):
+    clock = types.SimpleNamespace(monotonic=lambda: 100.0)
+    monkeypatch.setattr(search, 'time', clock)
+    recipe = seeder.recipe(user)
+    response = user_client.get('/api/ingredients/')
+    etag = response['ETag']
+    assert user_client.get('/api/ingredients/?name=соус').json() == []
+
+    other_process_import(('соус соевый', 'мл'))
+    imported = Ingredient.objects.get(name='соус соевый')
+
+    response = user_client.get('/api/ingredients/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert imported.id in [item['id'] for item in response.json()]
+    # Автодополнение узнаёт о новой версии не позже, чем через
+    # INGREDIENTS_VERSION_CHECK_INTERVAL секунд.
+    assert user_client.get('/api/ingredients/?name=соус').json() == []
+    interval = settings.INGREDIENTS_VERSION_CHECK_INTERVAL
+    clock.monotonic = lambda: 100.0 + interval
+    assert [
+        item['id']
+        for item in user_client.get('/api/ingredients/?name=соус').json()
+    ] == [imported.id]
+    response = user_client.patch(f'/api/recipes/{recipe.id}/', {
+        'ingredients': [{'id': imported.id, 'amount': 10}]
+    }, format='json')
+    assert response.status_code == 200, response.json()
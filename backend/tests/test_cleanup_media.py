@@ -0,0 +1,114 @@
+import os
+import re
+import time
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipes.management.commands.cleanup_media import Command
+from recipes.models import Recipe
+
+DAY = 24 * 60 * 60
+REFERENCED = 'recipes/images/ab/cd/abcd.png'
+OLD_ORPHANS = (
+    'recipes/images/legacy1.png',
+    'recipes/images/legacy2.png',
+    'recipes/images/legacy3.png',
+    'recipes/images/ef/01/ef01.png',
+    'derivatives/recipes/images/ef/01/ef01.png.320.webp',
+)
+KEPT = (
+    REFERENCED,
+    'derivatives/recipes/images/ab/cd/abcd.png.320.webp',
+    'recipes/images/fresh.png',
+)
+
+
+@pytest.fixture
+def media(settings, seeder, user):
+    """Файлы картинок: на REFERENCED ссылается рецепт, fresh.png
+    загружен только что, остальные - старые и ничьи."""
+    root = settings.MEDIA_ROOT
+    for name in OLD_ORPHANS + KEPT:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'image')
+        if name != 'recipes/images/fresh.png':
+            os.utime(path, (time.time() - 2 * DAY,) * 2)
+    os.utime(root / 'recipes/images/temp.png', (time.time() - 2 * DAY,) * 2)
+    Recipe.objects.filter(pk=seeder.recipe(user).pk).update(image=REFERENCED)
+    return root
+
+
+def cleanup(media, *args):
+    out = StringIO()
+    call_command(
+        'cleanup_media', '--delete',
+        '--checkpoint', str(media / 'checkpoint'), *args, stdout=out
+    )
+    return int(re.search(r'Просмотрено файлов: (\d+)', out.getvalue())[1])
+
+
+def existing(media):
+    return {
+        name for name in OLD_ORPHANS + KEPT + ('recipes/images/temp.png',)
+        if (media / name).exists()
+    }
+
+
+@pytest.mark.django_db
+def test_deletes_old_orphans_only(media):
+    assert cleanup(media) == len(OLD_ORPHANS + KEPT) + 1
+
+    assert existing(media) == set(KEPT)
+    assert not (media / 'checkpoint').exists()
+
+
+@pytest.mark.django_db
+def test_limit_continues_from_checkpoint(media):
+    scanned = [cleanup(media, '--limit', '3', '--batch-size', '2')]
+    assert (media / 'checkpoint').exists()
+    while (media / 'checkpoint').exists():
+        scanned.append(cleanup(media, '--limit', '3', '--batch-size', '2'))
+
+    assert sum(scanned) == len(OLD_ORPHANS + KEPT) + 1
+    assert existing(media) == set(KEPT)
+
+
+@pytest.mark.django_db
+def test_interrupted_run_resumes(media, monkeypatch):
+    find_orphans = Command.find_orphans
+    calls = []
+
+    def interrupt(self, batch):
+        calls.append(batch)
+        if len(calls) > 1:
+            raise KeyboardInterrupt
+        return find_orphans(self, batch)
+
+    monkeypatch.setattr(Command, 'find_orphans', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        cleanup(media, '--batch-size', '2')
+    monkeypatch.setattr(Command, 'find_orphans', find_orphans)
+
+    assert (media / 'checkpoint').exists()
+    assert cleanup(media, '--batch-size', '2') == len(OLD_ORPHANS + KEPT) - 1
+    assert existing(media) == set(KEPT)
+
+
+@pytest.mark.django_db
+def test_checkpoint_outside_media_and_dotfiles_kept(media, settings,
+                                                    tmp_path_factory):
+    settings.COMMAND_STATE_DIR = tmp_path_factory.mktemp('state')
+    hidden = media / 'recipes/images/.keep'
+    hidden.write_bytes(b'')
+    os.utime(hidden, (time.time() - 2 * DAY,) * 2)
+
+    call_command('cleanup_media', '--delete', '--limit', '3',
+                 stdout=StringIO())
+
+    assert (settings.COMMAND_STATE_DIR / 'cleanup_media_checkpoint').exists()
+    assert not any(
+        path.name.endswith('checkpoint') for path in media.rglob('*'))
+    assert hidden.exists()
@@ -0,0 +1,84 @@
+import pytest
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, IngredientRecipe, TagRecipe
+
+
+def assert_not_modified(client, url, etag, expected=True):
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == (304 if expected else 200)
+
+
+@pytest.fixture
+def recipes(seeder, user):
+    author = seeder.author()
+    return [seeder.recipe(author) for _ in range(3)]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', (
+    '/api/recipes/',
+    '/api/recipes/?pagination=cursor',
+))
+def test_unchanged_list_is_not_modified(url, recipes, user_client):
+    etag = user_client.get(url)['ETag']
+
+    assert_not_modified(user_client, url, etag)
+
+
+@pytest.mark.django_db
+def test_popular_order_change_by_other_users(recipes, seeder, user_client):
+    url = '/api/recipes/?ordering=popular'
+    etag = user_client.get(url)['ETag']
+
+    Favorite.objects.create(user=seeder.author(), recipe=recipes[0])
+
+    assert_not_modified(user_client, url, etag, expected=False)
+    assert user_client.get(url).json()['results'][0]['id'] == recipes[0].id
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('make_url', (
+    lambda recipe: '/api/recipes/',
+    lambda recipe: f'/api/recipes/{recipe.id}/',
+))
+def test_author_profile_change(make_url, recipes, user_client):
+    url = make_url(recipes[0])
+    etag = user_client.get(url)['ETag']
+
+    author = recipes[0].author
+    author.first_name = 'Другое имя'
+    author.save()
+
+    assert_not_modified(user_client, url, etag, expected=False)
+
+
+@pytest.mark.django_db
+def test_admin_changes_of_recipe_rows(recipes, seeder, admin_client,
+                                      user_client):
+    recipe = recipes[0]
+    url = f'/api/recipes/{recipe.id}/'
+    etag = user_client.get(url)['ETag']
+
+    row = IngredientRecipe.objects.filter(recipe=recipe).first()
+    admin_client.post(
+        f'/admin/recipes/ingredientrecipe/{row.pk}/change/',
+        {'recipe': recipe.pk, 'ingredient': row.ingredient_id, 'amount': 7}
+    )
+    assert IngredientRecipe.objects.get(pk=row.pk).amount == 7
+    assert_not_modified(user_client, url, etag, expected=False)
+
+    etag = user_client.get(url)['ETag']
+    row = TagRecipe.objects.filter(recipe=recipe).first()
+    admin_client.post(
+        f'/admin/recipes/tagrecipe/{row.pk}/delete/', {'post': 'yes'})
+    assert not TagRecipe.objects.filter(pk=row.pk).exists()
+    assert_not_modified(user_client, url, etag, expected=False)
+
+
+@pytest.mark.django_db
+def test_recipe_has_no_last_modified(recipes):
+    response = APIClient().get(f'/api/recipes/{recipes[0].id}/')
+
+    assert response.has_header('ETag')
+    assert not response.has_header('Last-Modified')
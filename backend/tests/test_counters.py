@@ -0,0 +1,65 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe
+
+
+def counters(user, recipe):
+    user.refresh_from_db()
+    recipe.refresh_from_db()
+    return (user.recipes_count, user.subscribers_count,
+            recipe.favorites_count, recipe.in_carts_count)
+
+
+@pytest.mark.django_db
+def test_recipe_counter_follows_create_and_delete(seeder, user, user_client,
+                                                  recipe_payload):
+    response = user_client.post(
+        '/api/recipes/', recipe_payload(seeder.ingredients[:2]),
+        format='json')
+    recipe = Recipe.objects.get(pk=response.json()['id'])
+    seeder.recipe(user)
+    user.refresh_from_db()
+    assert user.recipes_count == 2
+
+    assert user_client.delete(
+        f'/api/recipes/{recipe.id}/').status_code == 204
+    user.refresh_from_db()
+    assert user.recipes_count == 1
+
+
+@pytest.mark.django_db
+def test_subscribers_counter_follows_subscriptions(seeder, user_client):
+    author = seeder.author()
+    url = f'/api/users/{author.id}/subscribe/'
+
+    assert user_client.post(url).status_code == 201
+    author.refresh_from_db()
+    assert author.subscribers_count == 1
+
+    assert user_client.delete(url).status_code == 204
+    author.refresh_from_db()
+    assert author.subscribers_count == 0
+
+
+@pytest.mark.django_db
+def test_recount_repairs_drifted_counters(seeder, user):
+    author = seeder.author()
+    recipe = seeder.recipe(author)
+    seeder.recipe(author)
+    Subscribe.objects.create(user=user, author=author)
+    Favorite.objects.create(user=user, recipe=recipe)
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    expected = counters(author, recipe)
+    assert expected == (2, 1, 1, 1)
+
+    type(author).objects.filter(pk=author.pk).update(
+        recipes_count=10, subscribers_count=0)
+    Recipe.objects.filter(pk=recipe.pk).update(
+        favorites_count=0, in_carts_count=7)
+    call_command('recount_counters', '--batch-size', '1', stdout=StringIO())
+
+    assert counters(author, recipe) == expected
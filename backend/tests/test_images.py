@@ -0,0 +1,113 @@
+import hashlib
+import os
+import time
+
+import pytest
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from rest_framework.test import APIClient
+
+from recipes import images
+from recipes.images import (
+    derivative_name, generate_derivatives, release_image
+)
+from recipes.models import Recipe
+
+PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAAD'
+    'UlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+@pytest.mark.django_db
+def test_derivatives_change_validators(seeder, user):
+    recipe = seeder.recipe(user)
+    client = APIClient()
+    url = f'/api/recipes/{recipe.id}/'
+    response = client.get(url)
+    assert response.json()['image_thumb'].endswith('/temp.png')
+
+    generate_derivatives(recipe.id)
+
+    updated = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert updated.status_code == 200
+    assert updated.json()['image_thumb'].endswith('.320.webp')
+
+
+def upload(content, name='recipes/images/photo.png'):
+    return Recipe._meta.get_field('image').storage.save(
+        name, ContentFile(content))
+
+
+@pytest.mark.django_db
+def test_storage_names_files_by_content():
+    storage = Recipe._meta.get_field('image').storage
+    digest = hashlib.sha256(b'image').hexdigest()
+
+    first = upload(b'image')
+    second = upload(b'image', 'recipes/images/copy.PNG')
+
+    assert first == second == (
+        f'recipes/images/{digest[:2]}/{digest[2:4]}/{digest}.png'
+    )
+    assert storage.open(first).read() == b'image'
+    assert upload(b'other') != first
+
+
+def age(name, seconds):
+    path = Recipe._meta.get_field('image').storage.path(name)
+    os.utime(path, (time.time() - seconds,) * 2)
+
+
+@pytest.mark.django_db
+def test_image_is_released_with_last_recipe(
+        seeder, user, django_capture_on_commit_callbacks):
+    storage = Recipe._meta.get_field('image').storage
+    name = upload(b'image')
+    first, second = (seeder.recipe(user) for _ in range(2))
+    Recipe.objects.filter(pk__in=(first.pk, second.pk)).update(image=name)
+    derivative = derivative_name(name, 320, 'webp')
+    default_storage.save(derivative, ContentFile(b'thumb'))
+    age(name, settings.RECIPE_IMAGE_RELEASE_GRACE + 1)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Recipe.objects.get(pk=first.pk).delete()
+    assert storage.exists(name)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Recipe.objects.get(pk=second.pk).delete()
+    assert not storage.exists(name)
+    assert not default_storage.exists(derivative)
+
+
+@pytest.mark.django_db
+def test_fresh_upload_is_not_released():
+    storage = Recipe._meta.get_field('image').storage
+    name = upload(b'image')
+    age(name, settings.RECIPE_IMAGE_RELEASE_GRACE + 1)
+    # Та же картинка загружается заново, рецепт ещё не сохранён.
+    upload(b'image')
+
+    release_image(name)
+
+    assert storage.exists(name)
+
+
+@pytest.mark.django_db
+def test_failed_derivatives_keep_original(
+        seeder, user_client, monkeypatch, django_capture_on_commit_callbacks):
+    def missing_file(recipe_id):
+        raise FileNotFoundError(recipe_id)
+
+    monkeypatch.setattr(images, 'generate_derivatives', missing_file)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = user_client.post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'image': PNG, 'tags': [seeder.tags[0].id],
+            'ingredients': [{'id': seeder.ingredients[0].id, 'amount': 1}],
+        }, format='json')
+
+    assert response.status_code == 201
+    recipe = Recipe.objects.get(pk=response.json()['id'])
+    assert response.json()['image_thumb'].endswith(recipe.image.name)
@@ -0,0 +1,58 @@
+import pytest
+from django.db.models import F
+
+from recipes.models import CatalogVersion, IngredientRecipe
+from recipes.postings import SEQUENCE_NAME
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('max_ids', (10000, 0))
+def test_recipe_ingredient_filters(max_ids, seeder, user, user_client,
+                                   settings,
+                                   django_capture_on_commit_callbacks):
+    settings.INGREDIENT_FILTER_MAX_IDS = max_ids
+    first, second = (seeder.recipe(user) for _ in range(2))
+    salt, *_, pepper = (ingredient.id for ingredient in seeder.ingredients)
+
+    def found(query):
+        response = user_client.get(f'/api/recipes/?{query}')
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    assert found(f'ingredients={salt}') == {first.id, second.id}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.patch(f'/api/recipes/{second.id}/', {'ingredients': [
+            {'id': pepper, 'amount': 1}
+        ]}, format='json')
+
+    assert found(f'ingredients={salt}') == {first.id}
+    assert found(f'ingredients={salt},{pepper}') == set()
+    assert found(f'ingredients={pepper}') == {second.id}
+    assert found(f'exclude_ingredients={salt}') == {second.id}
+    assert found(
+        f'ingredients={pepper}&exclude_ingredients={salt}') == {second.id}
+    assert found(
+        f'ingredients={salt}&exclude_ingredients={pepper}') == {first.id}
+
+
+@pytest.mark.django_db
+def test_change_in_another_process_rebuilds_index(seeder, user, user_client):
+    first, second = (seeder.recipe(user) for _ in range(2))
+    salt = seeder.ingredients[0].id
+    url = f'/api/recipes/?ingredients={salt}'
+
+    def found():
+        return {
+            recipe['id'] for recipe in user_client.get(url).json()['results']
+        }
+
+    assert found() == {first.id, second.id}
+
+    # Другой процесс меняет ингредиенты рецепта: его журнал в кэше
+    # этого процесса не виден, новый номер - только в базе.
+    IngredientRecipe.objects.filter(
+        recipe=second, ingredient_id=salt).delete()
+    CatalogVersion.objects.filter(name=SEQUENCE_NAME).update(
+        version=F('version') + 1)
+
+    assert found() == {first.id}
@@ -0,0 +1,66 @@
+import types
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Ingredient
+from recipes import search as search_module
+from recipes.search import ingredient_index
+
+NAMES = (
+    'соль', 'молоки', 'сгущённое молоко', 'молоко топлёное',
+    'кокосовое молоко', 'молоко',
+)
+
+
+def search(query):
+    return [item['name'] for item in ingredient_index.search(query)]
+
+
+@pytest.fixture
+def ingredients(db):
+    return {
+        name: Ingredient.objects.create(name=name, measurement_unit='г')
+        for name in NAMES
+    }
+
+
+def test_prefix_then_substring_then_fuzzy(ingredients):
+    assert search('Молоко') == [
+        'молоко', 'молоко топлёное', 'кокосовое молоко', 'сгущённое молоко',
+        'молоки',
+    ]
+
+
+def test_index_is_rebuilt_after_ingredient_change(
+        ingredients, django_capture_on_commit_callbacks):
+    assert search('соев') == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        salt = ingredients['соль']
+        salt.name = 'соевый соус'
+        salt.save()
+        Ingredient.objects.create(name='соевое молоко', measurement_unit='мл')
+
+    assert search('соев') == ['соевое молоко', 'соевый соус']
+    assert search('соль') == []
+
+
+def test_version_is_checked_once_per_interval(ingredients, monkeypatch,
+                                              settings):
+    settings.INGREDIENTS_VERSION_CHECK_INTERVAL = 5
+    clock = types.SimpleNamespace(monotonic=lambda: 100.0)
+    monkeypatch.setattr(search_module, 'time', clock)
+
+    def queries(query):
+        with CaptureQueriesContext(connection) as context:
+            search(query)
+        return len(context)
+
+    assert queries('мол') == 2
+    assert queries('молок') == 0
+    clock.monotonic = lambda: 104.0
+    assert queries('соль') == 0
+    clock.monotonic = lambda: 105.0
+    assert queries('соль') == 1
@@ -0,0 +1,71 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipes.management.commands import ingredients_import
+from recipes.models import Ingredient
+
+ROWS = (
+    ('мука', 'г'),
+    ('молоко', 'мл'),
+    ('яйца', 'шт.'),
+    ('мука', 'кг'),
+)
+
+
+def run_import(path, *args):
+    out = StringIO()
+    call_command('ingredients_import', '--path', str(path), *args, stdout=out)
+    return out.getvalue()
+
+
+def ingredients():
+    return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text(
+        ''.join(f'{name},{unit}\n' for name, unit in ROWS), encoding='utf-8'
+    )
+    return path
+
+
+@pytest.mark.django_db
+def test_import_is_idempotent(csv_file):
+    Ingredient.objects.create(name='молоко', measurement_unit='мл')
+
+    output = run_import(csv_file, '--batch-size', '2')
+
+    assert 'Добавлено ингредиентов: 2, пропущено: 2' in output
+    assert ingredients() == {('мука', 'г'), ('молоко', 'мл'), ('яйца', 'шт.')}
+
+    output = run_import(csv_file)
+
+    assert 'Добавлено ингредиентов: 0, пропущено: 4' in output
+    assert Ingredient.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_import_json_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingredients_import, 'READ_CHUNK_SIZE', 8)
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps([
+        {'name': name, 'measurement_unit': unit} for name, unit in ROWS
+    ], ensure_ascii=False, indent=2), encoding='utf-8')
+
+    output = run_import(path)
+
+    assert 'Добавлено ингредиентов: 3, пропущено: 1' in output
+    assert ingredients() == {('мука', 'г'), ('молоко', 'мл'), ('яйца', 'шт.')}
+
+
+@pytest.mark.django_db
+def test_dry_run_writes_nothing(csv_file):
+    output = run_import(csv_file, '--dry-run')
+
+    assert 'Пробный запуск. Добавлено ингредиентов: 3' in output
+    assert not Ingredient.objects.exists()
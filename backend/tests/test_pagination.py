@@ -0,0 +1,68 @@
+import base64
+import json
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+URL = '/api/recipes/?pagination=cursor&ordering=cooking_time'
+
+
+def make_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def get_cursor(link):
+    return parse_qs(urlparse(link).query)['cursor'][0]
+
+
+@pytest.fixture
+def recipes(seeder, user):
+    recipes = [seeder.recipe(user) for _ in range(8)]
+    for cooking_time, recipe in zip((5, 1, 5, 3, 9, 1, 2, 7), recipes):
+        recipe.cooking_time = cooking_time
+        recipe.save()
+    return recipes
+
+
+@pytest.mark.django_db
+def test_cursor_walks_all_pages_in_order(recipes, user_client):
+    found = []
+    url = URL
+    while url:
+        response = user_client.get(url)
+        assert response.status_code == 200
+        found.extend(recipe['id'] for recipe in response.data['results'])
+        url = response.data['next']
+
+    assert found == [
+        recipe.id for recipe in sorted(
+            recipes, key=lambda recipe: (recipe.cooking_time, recipe.id))
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('cursor', (
+    'не base64',
+    make_cursor([1, 2]),
+    make_cursor({'ordering': ['cooking_time', 'id'], 'values': [1]}),
+    make_cursor({'ordering': ['cooking_time', 'id'], 'values': ['x', 1]}),
+    make_cursor({'ordering': ['cooking_time', 'id'], 'values': [1, None]}),
+    make_cursor({'ordering': ['cooking_time', 'id'], 'values': [[1], {}]}),
+    make_cursor({'ordering': ['-pub_date', '-id'],
+                 'values': ['вчера', 1]}),
+))
+def test_tampered_cursor_is_rejected(cursor, recipes, user_client):
+    response = user_client.get(f'{URL}&cursor={cursor}')
+
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_cursor_of_another_ordering_is_rejected(recipes, user_client):
+    cursor = get_cursor(user_client.get(URL).data['next'])
+
+    response = user_client.get(
+        f'/api/recipes/?pagination=cursor&ordering=popular&cursor={cursor}'
+    )
+
+    assert response.status_code == 404
@@ -0,0 +1,78 @@
+import pytest
+from django.db.models import F
+
+from recipes import postings
+from recipes.models import CatalogVersion, IngredientRecipe
+
+
+@pytest.mark.django_db
+def test_pantry_ranks_by_missing_ingredients(
+        seeder, user, user_client, count_queries,
+        django_capture_on_commit_callbacks):
+    ingredients = [ingredient.id for ingredient in seeder.ingredients]
+    full, partial, other, deleted = (seeder.recipe(user) for _ in range(4))
+    with django_capture_on_commit_callbacks(execute=True):
+        for recipe, used in ((partial, ingredients[:3]),
+                             (other, ingredients[5:])):
+            user_client.patch(f'/api/recipes/{recipe.id}/', {'ingredients': [
+                {'id': ingredient_id, 'amount': 1} for ingredient_id in used
+            ]}, format='json')
+    url = f'/api/recipes/pantry/?ingredients={ingredients[0]},' \
+          f'{ingredients[1]},{ingredients[2]},{ingredients[9]}&limit=3'
+    user_client.get(url)
+    with django_capture_on_commit_callbacks(execute=True):
+        deleted.delete()
+
+    response = user_client.get(url)
+
+    assert [
+        (recipe['id'], recipe['matched'],
+         [item['id'] for item in recipe['missing']])
+        for recipe in response.json()['results']
+    ] == [
+        (partial.id, 3, []),
+        (full.id, 3, ingredients[3:5]),
+        (other.id, 1, ingredients[5:9]),
+    ]
+    assert count_queries(user_client, 'get', url, 200) <= 3
+    assert user_client.get(
+        '/api/recipes/pantry/?ingredients=a').status_code == 400
+
+
+@pytest.mark.django_db
+def test_pantry_sees_changes_from_another_process(seeder, user, user_client):
+    recipe = seeder.recipe(user)
+    ingredients = [ingredient.id for ingredient in seeder.ingredients]
+    url = f'/api/recipes/pantry/?ingredients={ingredients[0]}'
+    assert user_client.get(url).json()['results'][0]['matched'] == 1
+
+    IngredientRecipe.objects.filter(
+        recipe=recipe, ingredient_id=ingredients[0]).delete()
+    CatalogVersion.objects.filter(name=postings.SEQUENCE_NAME).update(
+        version=F('version') + 1)
+
+    assert user_client.get(url).json()['results'] == []
+
+
+@pytest.mark.django_db
+def test_pantry_skips_ingredient_deleted_meanwhile(seeder, user, user_client,
+                                                   monkeypatch):
+    recipe = seeder.recipe(user)
+    ingredients = [ingredient.id for ingredient in seeder.ingredients]
+    get_catalog = postings.get_catalog
+
+    def without_last(name, version=None):
+        # Ингредиент удалён между чтением индекса и справочника.
+        return [
+            item for item in get_catalog(name, version)
+            if item['id'] != ingredients[4]
+        ]
+
+    monkeypatch.setattr(postings, 'get_catalog', without_last)
+    response = user_client.get(
+        f'/api/recipes/pantry/?ingredients={ingredients[0]}')
+
+    assert response.status_code == 200
+    assert [item['id'] for item in response.json()['results'][0][
+        'missing']] == ingredients[1:4]
+    assert response.json()['results'][0]['id'] == recipe.id
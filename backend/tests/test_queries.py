@@ -0,0 +1,242 @@
+"""Регрессионные тесты на число SQL-запросов к API.
+
+Каждый эндпоинт вызывается на маленьком и на большом наборе данных:
+число запросов не должно зависеть от объёма данных и размера страницы
+и не должно превышать заданную границу.
+"""
+import pytest
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Ingredient, ShoppingCart
+from users.models import Subscribe
+
+
+def favorited_recipe(seeder):
+    recipe = seeder.recipe(seeder.author())
+    Favorite.objects.create(user=seeder.user, recipe=recipe)
+    return recipe
+
+
+def carted_recipe(seeder):
+    recipe = seeder.recipe(seeder.author())
+    ShoppingCart.objects.create(user=seeder.user, recipe=recipe)
+    return recipe
+
+
+def subscribed_author(seeder):
+    author = seeder.author()
+    Subscribe.objects.create(user=seeder.user, author=author)
+    return author
+
+
+ENDPOINTS = {
+    'recipes-list': (
+        5, lambda seeder: ('get', '/api/recipes/', 200)),
+    'recipes-list-filtered': (
+        6, lambda seeder: (
+            'get', '/api/recipes/?is_favorited=1&tags=tag0', 200)),
+    'recipes-list-cursor': (
+        4, lambda seeder: (
+            'get', '/api/recipes/?pagination=cursor&ordering=cooking_time',
+            200)),
+    'recipes-list-trending': (
+        5, lambda seeder: ('get', '/api/recipes/?ordering=trending', 200)),
+    'recipes-detail': (
+        6, lambda seeder: (
+            'get', f'/api/recipes/{seeder.recipe(seeder.author()).id}/', 200)),
+    'users-list': (
+        2, lambda seeder: ('get', '/api/users/', 200)),
+    'users-detail': (
+        1, lambda seeder: ('get', f'/api/users/{seeder.author().id}/', 200)),
+    'users-me': (
+        1, lambda seeder: ('get', '/api/users/me/', 200)),
+    'subscriptions': (
+        3, lambda seeder: ('get', '/api/users/subscriptions/', 200)),
+    'subscriptions-limited': (
+        3, lambda seeder: (
+            'get', '/api/users/subscriptions/?recipes_limit=1', 200)),
+    'subscribe-add': (
+        6, lambda seeder: (
+            'post', f'/api/users/{seeder.author().id}/subscribe/', 201)),
+    'subscribe-remove': (
+        4, lambda seeder: (
+            'delete',
+            f'/api/users/{subscribed_author(seeder).id}/subscribe/', 204)),
+    'ingredients-search': (
+        1, lambda seeder: ('get', '/api/ingredients/?name=ингр', 200)),
+    'tags-list': (
+        1, lambda seeder: ('get', '/api/tags/', 200)),
+    'favorite-add': (
+        5, lambda seeder: (
+            'post',
+            f'/api/recipes/{seeder.recipe(seeder.author()).id}/favorite/',
+            201)),
+    'favorite-remove': (
+        4, lambda seeder: (
+            'delete',
+            f'/api/recipes/{favorited_recipe(seeder).id}/favorite/', 204)),
+    'shopping-cart-add': (
+        6, lambda seeder: (
+            'post',
+            f'/api/recipes/{seeder.recipe(seeder.author()).id}'
+            '/shopping_cart/',
+            201)),
+    'shopping-cart-remove': (
+        6, lambda seeder: (
+            'delete',
+            f'/api/recipes/{carted_recipe(seeder).id}/shopping_cart/', 204)),
+    'shopping-cart-download': (
+        1, lambda seeder: (
+            'get', '/api/recipes/download_shopping_cart/', 200)),
+    'shopping-list': (
+        1, lambda seeder: ('get', '/api/shopping_list/', 200)),
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_query_count_does_not_grow(endpoint, seeder, user_client,
+                                   count_queries):
+    max_queries, make_request = ENDPOINTS[endpoint]
+
+    seeder.seed(authors=1, recipes_per_author=1)
+    # Первый запрос может заполнить кэши процесса.
+    count_queries(user_client, *make_request(seeder))
+    small = count_queries(user_client, *make_request(seeder))
+
+    seeder.seed(authors=8, recipes_per_author=4)
+    large = count_queries(user_client, *make_request(seeder))
+
+    assert small == large, (
+        f'{endpoint}: число запросов растёт с объёмом данных '
+        f'({small} -> {large})'
+    )
+    assert large <= max_queries, (
+        f'{endpoint}: {large} запросов, допустимо не более {max_queries}'
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ('/api/recipes/', '/api/users/'))
+def test_anonymous_query_count_does_not_grow(url, seeder, count_queries):
+    client = APIClient()
+
+    seeder.seed(authors=1, recipes_per_author=1)
+    # Первый запрос может заполнить кэши процесса и версии справочников.
+    count_queries(client, 'get', url, 200)
+    small = count_queries(client, 'get', url, 200)
+
+    seeder.seed(authors=8, recipes_per_author=4)
+    large = count_queries(client, 'get', url, 200)
+
+    assert small == large
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url, max_queries', (
+    ('/api/recipes/', 5),
+    ('/api/tags/', 1),
+    ('/api/ingredients/?name=ингр', 1),
+))
+def test_not_modified_skips_serialization(url, max_queries, seeder,
+                                          user_client, count_queries):
+    seeder.seed(authors=8, recipes_per_author=4)
+    etag = user_client.get(url)['ETag']
+
+    queries = count_queries(user_client, 'get', url, 304,
+                            HTTP_IF_NONE_MATCH=etag)
+
+    assert queries <= max_queries
+
+
+@pytest.mark.django_db
+def test_recipe_create_query_count_does_not_grow(seeder, user_client,
+                                                 count_queries,
+                                                 recipe_payload):
+    ingredients = [
+        Ingredient.objects.create(name=f'продукт {number}',
+                                  measurement_unit='г')
+        for number in range(40)
+    ]
+    count_queries(user_client, 'post', '/api/recipes/', 201,
+                  data=recipe_payload(ingredients[:1]),
+                  format='json')
+
+    small = count_queries(user_client, 'post', '/api/recipes/', 201,
+                          data=recipe_payload(ingredients[:3]),
+                          format='json')
+    large = count_queries(user_client, 'post', '/api/recipes/', 201,
+                          data=recipe_payload(ingredients),
+                          format='json')
+
+    assert small == large, f'{small} -> {large}'
+
+
+@pytest.mark.django_db
+def test_recipe_update_query_count_does_not_grow(seeder, user, user_client,
+                                                 count_queries):
+    ingredients = seeder.ingredients
+    # Первый запрос заполняет кэш справочников.
+    user_client.patch(f'/api/recipes/{seeder.recipe(user).id}/',
+                      {'ingredients': [{'id': ingredients[0].id,
+                                        'amount': 1}]}, format='json')
+    small = count_queries(
+        user_client, 'patch', f'/api/recipes/{seeder.recipe(user).id}/',
+        200, format='json', data={'ingredients': [
+            {'id': ingredients[0].id, 'amount': 6},
+            {'id': ingredients[5].id, 'amount': 6},
+        ]}
+    )
+    large = count_queries(
+        user_client, 'patch', f'/api/recipes/{seeder.recipe(user).id}/',
+        200, format='json', data={'ingredients': [
+            {'id': ingredient.id, 'amount': 6}
+            for ingredient in ingredients[:3] + ingredients[5:]
+        ]}
+    )
+
+    assert small == large, f'{small} -> {large}'
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url, make_target', (
+    ('/api/recipes/favorite/', lambda seeder: seeder.recipe(seeder.author())),
+    ('/api/recipes/shopping_cart/',
+     lambda seeder: seeder.recipe(seeder.author())),
+    ('/api/users/subscribe/', lambda seeder: seeder.author()),
+))
+def test_bulk_query_count_does_not_grow(url, make_target, seeder,
+                                        user_client, count_queries):
+    def ids(count):
+        return [make_target(seeder).id for _ in range(count)] + [100500]
+
+    counts = []
+    for method, status in (('post', 200), ('delete', 200)):
+        few, many = ids(2), ids(20)
+        small = count_queries(user_client, method, url, status,
+                              data={'ids': few}, format='json')
+        large = count_queries(user_client, method, url, status,
+                              data={'ids': many}, format='json')
+        counts.append((small, large))
+    assert all(small == large for small, large in counts), counts
+
+
+ADMIN_CHANGELISTS = (
+    'recipes/recipe', 'recipes/ingredient', 'recipes/ingredientrecipe',
+    'recipes/tagrecipe', 'recipes/favorite', 'recipes/shoppingcart',
+    'users/user', 'users/subscribe',
+)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('changelist', ADMIN_CHANGELISTS)
+def test_admin_changelist_query_count_does_not_grow(changelist, seeder,
+                                                    admin_client,
+                                                    count_queries):
+    url = f'/admin/{changelist}/'
+    seeder.seed(authors=1, recipes_per_author=1)
+    small = count_queries(admin_client, 'get', url, 200)
+    seeder.seed(authors=4, recipes_per_author=4)
+    large = count_queries(admin_client, 'get', url, 200)
+
+    assert large == small
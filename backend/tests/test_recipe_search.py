@@ -0,0 +1,26 @@
+import pytest
+
+from recipes.models import Ingredient
+
+
+@pytest.mark.django_db
+def test_recipe_search_ranks_name_above_text(seeder, user, user_client):
+    in_text, in_name, other = (seeder.recipe(user) for _ in range(3))
+    in_name.name = 'Борщ со сметаной'
+    in_name.save()
+    in_text.text = 'Подавать борщ горячим'
+    in_text.save()
+
+    response = user_client.get('/api/recipes/?search=борща')
+
+    assert [recipe['id'] for recipe in response.json()['results']] == [
+        in_name.id, in_text.id]
+
+    user_client.patch(f'/api/recipes/{other.id}/', {'ingredients': [
+        {'id': Ingredient.objects.create(
+            name='Свёкла', measurement_unit='г').id, 'amount': 1}
+    ]}, format='json')
+    response = user_client.get('/api/recipes/?search=свекла')
+
+    assert [recipe['id'] for recipe in response.json()['results']] == [
+        other.id]
@@ -0,0 +1,48 @@
+import pytest
+
+from recipes.models import IngredientRecipe, ShoppingCart
+
+
+@pytest.mark.django_db
+def test_recipe_update_changes_only_edited_rows(seeder, user, user_client):
+    recipe = seeder.recipe(user)
+    rows = dict(recipe.ingredientrecipe_set.values_list('ingredient', 'id'))
+    kept, changed, removed = seeder.ingredients[:3]
+    added = seeder.ingredients[7]
+
+    user_client.patch(f'/api/recipes/{recipe.id}/', {'ingredients': [
+        {'id': kept.id, 'amount': 5},
+        {'id': changed.id, 'amount': 50},
+        {'id': added.id, 'amount': 1},
+    ]}, format='json')
+
+    after = {
+        row.ingredient_id: (row.id, row.amount)
+        for row in recipe.ingredientrecipe_set.all()
+    }
+    assert after.keys() == {kept.id, changed.id, added.id}
+    assert after[kept.id] == (rows[kept.id], 5)
+    assert after[changed.id] == (rows[changed.id], 50)
+    assert after[added.id][1] == 1
+    assert recipe.tags.count() == len(seeder.tags)
+
+
+@pytest.mark.django_db
+def test_recipe_update_collapses_duplicate_rows(seeder, user, user_client):
+    recipe = seeder.recipe(user)
+    salt, pepper = seeder.ingredients[:2]
+    IngredientRecipe.objects.create(recipe=recipe, ingredient=salt, amount=3)
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+
+    user_client.patch(f'/api/recipes/{recipe.id}/', {'ingredients': [
+        {'id': salt.id, 'amount': 5},
+        {'id': pepper.id, 'amount': 5},
+    ]}, format='json')
+
+    assert sorted(recipe.ingredientrecipe_set.values_list(
+        'ingredient_id', 'amount')) == [(salt.id, 5), (pepper.id, 5)]
+    shopping_list = {
+        item['id']: item['amount']
+        for item in user_client.get('/api/shopping_list/').json()
+    }
+    assert shopping_list == {salt.id: 5, pepper.id: 5}
@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.mark.django_db
+def test_recipe_validation_reports_all_errors(seeder, user_client,
+                                              recipe_payload):
+    ingredient = seeder.ingredients[0]
+    payload = recipe_payload((ingredient, ingredient))
+    payload['ingredients'].extend((
+        {'id': 100500, 'amount': 1}, {'id': 100501, 'amount': 1}
+    ))
+    payload['tags'] = [seeder.tags[0].id, seeder.tags[0].id, 100500]
+
+    response = user_client.post('/api/recipes/', payload, format='json')
+
+    assert response.status_code == 400
+    assert response.json() == {
+        'ingredients': [
+            'Несуществующие ингредиенты, выбирете ингредиенты из '
+            'предустановленного списка: 100500, 100501',
+            f'Вы уже выбрали ингредиенты: {ingredient.name}',
+        ],
+        'tags': [
+            'Несуществующие теги: 100500',
+            f'Вы уже выбрали теги: {seeder.tags[0].name}',
+        ],
+    }
@@ -0,0 +1,47 @@
+import pytest
+
+from recipes.models import Favorite
+
+
+@pytest.mark.django_db
+def test_bulk_favorite_results(seeder, user, user_client):
+    recipe, favorited = (seeder.recipe(seeder.author()) for _ in range(2))
+    Favorite.objects.create(user=user, recipe=favorited)
+
+    response = user_client.post(
+        '/api/recipes/favorite/',
+        {'ids': [recipe.id, favorited.id, recipe.id, 100500]}, format='json'
+    )
+
+    assert response.json() == {'results': [
+        {'id': recipe.id, 'status': 'created'},
+        {'id': favorited.id, 'status': 'exists'},
+        {'id': 100500, 'status': 'not_found'},
+    ]}
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 1
+
+    response = user_client.delete(
+        '/api/recipes/favorite/', {'ids': [recipe.id, favorited.id]},
+        format='json'
+    )
+
+    assert {item['status'] for item in response.json()['results']} == {
+        'deleted'}
+    assert not Favorite.objects.filter(user=user).exists()
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('relation', ('favorite', 'shopping_cart'))
+def test_repeated_add_and_remove(relation, seeder, user_client):
+    recipe = seeder.recipe(seeder.author())
+    url = f'/api/recipes/{recipe.id}/{relation}/'
+
+    assert user_client.post(url).status_code == 201
+    assert user_client.post(url).status_code == 400
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 404
+    assert user_client.post('/api/recipes/100500/favorite/').status_code == (
+        404)
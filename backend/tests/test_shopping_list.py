@@ -0,0 +1,39 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import ShoppingCart, ShoppingListItem
+
+
+@pytest.mark.django_db
+def test_shopping_list_follows_cart_and_recipe_changes(seeder, user,
+                                                       user_client):
+    first, second, deleted = (seeder.recipe(user) for _ in range(3))
+    ingredients = [ingredient.id for ingredient in seeder.ingredients]
+
+    def shopping_list():
+        return {
+            item['id']: item['amount']
+            for item in user_client.get('/api/shopping_list/').json()
+        }
+
+    ShoppingCart.objects.create(user=user, recipe=first)
+    user_client.post('/api/recipes/shopping_cart/', {
+        'ids': [second.id, deleted.id]}, format='json')
+    assert shopping_list() == {
+        ingredient_id: 15 for ingredient_id in ingredients[:5]}
+
+    user_client.patch(f'/api/recipes/{second.id}/', {'ingredients': [
+        {'id': ingredients[0], 'amount': 1},
+        {'id': ingredients[9], 'amount': 2},
+    ]}, format='json')
+    deleted.delete()
+    user_client.delete(f'/api/recipes/{first.id}/shopping_cart/')
+    assert shopping_list() == {ingredients[0]: 1, ingredients[9]: 2}
+
+    ShoppingListItem.objects.filter(user=user).update(amount=100)
+    output = StringIO()
+    call_command('rebuild_shopping_lists', stdout=output)
+    assert 'исправлено списков: 1' in output.getvalue()
+    assert shopping_list() == {ingredients[0]: 1, ingredients[9]: 2}
@@ -0,0 +1,57 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+
+@pytest.mark.django_db
+def test_similar_recipes(seeder, user, user_client, count_queries, tmp_path,
+                         django_capture_on_commit_callbacks):
+    ingredients = [ingredient.id for ingredient in seeder.ingredients]
+    recipes = [seeder.recipe(user) for _ in range(4)]
+    with django_capture_on_commit_callbacks(execute=True):
+        for recipe, used in zip(recipes, (
+                ingredients[:4], ingredients[:3], ingredients[6:9],
+                ingredients[7:])):
+            user_client.patch(f'/api/recipes/{recipe.id}/', {'ingredients': [
+                {'id': ingredient_id, 'amount': 1} for ingredient_id in used
+            ]}, format='json')
+    checkpoint = tmp_path / 'checkpoint'
+    call_command('build_similar_recipes', checkpoint=checkpoint,
+                 stdout=StringIO())
+    first, second, third, fourth = recipes
+
+    def similar(recipe):
+        response = user_client.get(f'/api/recipes/{recipe.id}/similar/')
+        return [item['id'] for item in response.json()]
+
+    assert similar(first)[0] == second.id
+    assert similar(third)[0] == fourth.id
+    assert count_queries(
+        user_client, 'get', f'/api/recipes/{first.id}/similar/', 200) == 1
+
+    user_client.patch(f'/api/recipes/{fourth.id}/', {'ingredients': [
+        {'id': ingredient_id, 'amount': 1}
+        for ingredient_id in ingredients[:4]
+    ]}, format='json')
+    call_command('build_similar_recipes', incremental=True,
+                 checkpoint=checkpoint, stdout=StringIO())
+
+    assert similar(first)[0] == fourth.id
+    assert similar(fourth)[0] == first.id
+    assert user_client.get('/api/recipes/0/similar/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_checkpoint_defaults_outside_media(seeder, user, settings,
+                                           tmp_path_factory):
+    seeder.recipe(user)
+    settings.COMMAND_STATE_DIR = tmp_path_factory.mktemp('state') / 'new'
+
+    call_command('build_similar_recipes', stdout=StringIO())
+
+    assert (settings.COMMAND_STATE_DIR / 'similar_recipes_checkpoint').exists()
+    assert not any(
+        path.name.endswith('checkpoint')
+        for path in settings.MEDIA_ROOT.rglob('*')
+    )
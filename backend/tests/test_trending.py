@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe
+from recipes.rankings import refresh_rankings
+
+
+@pytest.mark.django_db
+def test_trending_ordering(seeder, user, user_client):
+    old, fresh, favorited = (seeder.recipe(user) for _ in range(3))
+    now = timezone.now()
+    Recipe.objects.filter(pk__in=(old.pk, favorited.pk)).update(
+        pub_date=now - timedelta(days=30))
+    refresh_rankings(now=now)
+
+    def trending():
+        response = user_client.get('/api/recipes/?ordering=trending')
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    assert trending() == [fresh.id, favorited.id, old.id]
+
+    for _ in range(20):
+        Favorite.objects.create(user=seeder.author(), recipe=favorited)
+    refresh_rankings(now=now + timedelta(hours=1))
+
+    assert trending() == [favorited.id, fresh.id, old.id]
+
+
+@pytest.mark.django_db
+def test_refresh_changes_etag(seeder, user, user_client):
+    first, second = (seeder.recipe(user) for _ in range(2))
+    now = timezone.now()
+    refresh_rankings(now=now)
+    url = '/api/recipes/?ordering=trending'
+    response = user_client.get(url)
+    assert [recipe['id'] for recipe in response.json()['results']] == [
+        second.id, first.id]
+
+    for _ in range(20):
+        Favorite.objects.create(user=seeder.author(), recipe=first)
+    # Пересчёт меняет только таблицу рейтингов, ETag списка считается
+    # по загруженной странице, поэтому версия в кэше или базе не нужна.
+    refresh_rankings(now=now + timedelta(hours=1))
+
+    updated = user_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert updated.status_code == 200
+    assert [recipe['id'] for recipe in updated.json()['results']] == [
+        first.id, second.id]
@@ -0,0 +1,97 @@
+import base64
+import json
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from api import uploads
+from api.uploads import IMAGE_INVALID
+from recipes.models import Recipe
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGA'
+    'hKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+def multipart_payload(seeder, content, name='photo.png'):
+    return {
+        'name': 'Рецепт с фото',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'tags': [tag.id for tag in seeder.tags],
+        'ingredients': json.dumps([
+            {'id': ingredient.id, 'amount': 10}
+            for ingredient in seeder.ingredients[:3]
+        ]),
+        'image': SimpleUploadedFile(name, content, 'image/png'),
+    }
+
+
+@pytest.mark.django_db
+def test_multipart_upload(seeder, user_client):
+    response = user_client.post(
+        '/api/recipes/', multipart_payload(seeder, PNG), format='multipart')
+
+    assert response.status_code == 201, response.json()
+    recipe = Recipe.objects.get(pk=response.json()['id'])
+    assert recipe.image.read() == PNG
+    assert recipe.tags.count() == len(seeder.tags)
+    assert recipe.ingredients.count() == 3
+
+
+@pytest.mark.django_db
+def test_multipart_upload_too_large(seeder, user_client, settings):
+    settings.RECIPE_IMAGE_MAX_SIZE = len(PNG) - 1
+
+    response = user_client.post(
+        '/api/recipes/', multipart_payload(seeder, PNG), format='multipart')
+
+    assert response.status_code == 400
+    assert 'image' in response.json()
+    assert not Recipe.objects.exists()
+
+
+@pytest.mark.django_db
+def test_multipart_upload_not_an_image(seeder, user_client):
+    response = user_client.post(
+        '/api/recipes/',
+        multipart_payload(seeder, b'#!/bin/sh\necho image\n'),
+        format='multipart'
+    )
+
+    assert response.status_code == 400
+    assert IMAGE_INVALID in str(response.json()['image'])
+    assert not Recipe.objects.exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('image', (
+    'data:image/png;base64,' + base64.b64encode(b'not an image').decode(),
+    'data:image/png;base64,@@@@',
+))
+def test_base64_upload_not_an_image(image, seeder, user_client):
+    payload = multipart_payload(seeder, PNG)
+    payload['ingredients'] = json.loads(payload['ingredients'])
+    payload['image'] = image
+
+    response = user_client.post('/api/recipes/', payload, format='json')
+
+    assert response.status_code == 400
+    assert 'image' in response.json()
+
+
+@pytest.mark.django_db
+def test_base64_upload_with_line_breaks(seeder, user_client, monkeypatch):
+    # Части меньше строки: перенос попадает внутрь части.
+    monkeypatch.setattr(uploads, 'BASE64_CHUNK_SIZE', 24)
+    encoded = base64.encodebytes(PNG).decode()
+    assert '\n' in encoded.strip()
+    payload = multipart_payload(seeder, PNG)
+    payload['ingredients'] = json.loads(payload['ingredients'])
+    payload['image'] = 'data:image/png;base64,' + encoded
+
+    response = user_client.post('/api/recipes/', payload, format='json')
+
+    assert response.status_code == 201, response.json()
+    assert Recipe.objects.get(pk=response.json()['id']).image.read() == PNG
@@ -1,13 +1,14 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
+from foodgram.admin_tools import LargeTableAdmin
 from users.models import Subscribe
 
 User = get_user_model()
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     """Настройка админки для пользователей."""
 
     list_display = (
@@ -18,17 +19,24 @@ class UserAdmin(admin.ModelAdmin):
         'last_name',
         'password'
     )
-    search_fields = ('username', 'email')
-    list_filter = ('username', 'email')
+    search_fields = ('^username', '^email')
+    list_filter = ('is_staff', 'is_active')
+    export_fields = (
+        'pk', 'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'subscribers_count', 'date_joined'
+    )
     empty_value_display = '-пусто-'
 
 
 @admin.register(Subscribe)
-class SubscribeAdmin(admin.ModelAdmin):
+class SubscribeAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'user',
         'author'
     )
-    search_fields = ('pk', 'user')
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    autocomplete_fields = ('user', 'author')
+    export_fields = ('pk', 'user_id', 'author_id')
     empty_value_display = '-пусто-'
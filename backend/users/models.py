@@ -1,5 +1,23 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Exists, OuterRef, Value
+
+
+class UserQuerySet(models.QuerySet):
+    """Выборка пользователей с данными для отображения."""
+
+    def with_is_subscribed(self, user):
+        """Добавляет признак подписки текущего пользователя."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_subscribed=Value(False, output_field=models.BooleanField())
+            )
+        return self.annotate(is_subscribed=Exists(Subscribe.objects.filter(
+            user=user, author=OuterRef('pk'))))
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    """Менеджер пользователей с дополнительными выборками."""
 
 
 class User(AbstractUser):
@@ -29,6 +47,16 @@ class User(AbstractUser):
         blank=False,
         verbose_name='Фамилия пользователя'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество рецептов'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков'
+    )
+
+    objects = CustomUserManager()
 
     class Meta:
         ordering = ('id',)